@@ -0,0 +1,131 @@
+# 檔案：benchmarks/fake_client.py
+# 職責：離線基準測試用的模擬 Pyrogram 客戶端，不需連線即可驅動各項服務。
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+from pyrogram.enums import ChatType
+from pyrogram.errors import FloodWait, PeerIdInvalid
+
+class FakeChat:
+    def __init__(self, chat_id: int, title: str, chat_type: ChatType, members_count: int = 0):
+        self.id = chat_id
+        self.title = title
+        self.type = chat_type
+        self.members_count = members_count
+
+class FakeMessage:
+    """模擬 pyrogram.types.Message，支援 copy() 與相簿所需的欄位。"""
+
+    def __init__(self, client: "FakeClient", chat: FakeChat, message_id: int, text: str = "benchmark", date: datetime = None):
+        self._client = client
+        self.chat = chat
+        self.id = message_id
+        self.text = text
+        self.caption = None
+        self.caption_entities = None
+        self.media = None
+        self.media_group_id = None
+        self.photo = self.video = self.document = self.audio = None
+        self.date = date or datetime.now()
+        self.outgoing = True
+        self.empty = False
+        self.reply_to_message = None
+
+    async def copy(self, chat_id):
+        await self._client._call("copy_message", chat_id)
+
+class FakeDialog:
+    def __init__(self, chat: FakeChat, top_message: FakeMessage, is_pinned: bool = False):
+        self.chat = chat
+        self.top_message = top_message
+        self.is_pinned = is_pinned
+
+class FakeClient:
+    """
+    模擬 Client：
+    - latency：每次 API 呼叫的延遲秒數
+    - flood_rate / flood_wait：呼叫時拋出 FloodWait 的機率與等待秒數
+    - invalid_rate：呼叫時拋出 PeerIdInvalid 的機率
+    - dialog_count：get_dialogs() 返回的對話數 (約半數為超級群組/頻道)
+    """
+
+    DIALOG_PAGE_SIZE = 100
+
+    def __init__(self, latency: float = 0.005, flood_rate: float = 0.0, flood_wait: int = 1,
+                 invalid_rate: float = 0.0, dialog_count: int = 1000, seed: int = 0):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.flood_wait = flood_wait
+        self.invalid_rate = invalid_rate
+        self.random = random.Random(seed)
+        self.calls = {}
+        now = datetime.now()
+        self.dialogs = []
+        for i in range(dialog_count):
+            chat_type = [ChatType.SUPERGROUP, ChatType.CHANNEL, ChatType.PRIVATE, ChatType.GROUP][i % 4]
+            chat = FakeChat(-1000000000000 - i, f"Chat {i}", chat_type, members_count=100 + i)
+            top = FakeMessage(self, chat, 10000 - i, date=now - timedelta(minutes=i))
+            self.dialogs.append(FakeDialog(chat, top))
+        self.chats = {d.chat.id: d.chat for d in self.dialogs}
+
+    async def _call(self, method: str, chat_id=None):
+        self.calls[method] = self.calls.get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        roll = self.random.random()
+        if roll < self.flood_rate:
+            raise FloodWait(value=self.flood_wait)
+        if roll < self.flood_rate + self.invalid_rate:
+            raise PeerIdInvalid()
+
+    def make_message(self, text: str = "benchmark") -> FakeMessage:
+        return FakeMessage(self, FakeChat(-100, "Control", ChatType.SUPERGROUP), 1, text=text)
+
+    def bump_dialogs(self, count: int):
+        """模擬有 count 個對話收到新訊息 (移到列表最前面)，用於增量掃描測試。"""
+        for _ in range(count):
+            dialog = self.dialogs.pop(self.random.randrange(len(self.dialogs)))
+            dialog.top_message = FakeMessage(self, dialog.chat, dialog.top_message.id + 100000)
+            self.dialogs.insert(0, dialog)
+
+    async def get_chat(self, chat_id):
+        await self._call("get_chat", chat_id)
+        chat_id = int(chat_id) if str(chat_id).lstrip('-').isdigit() else chat_id
+        return self.chats.get(chat_id) or FakeChat(chat_id, f"Chat {chat_id}", ChatType.SUPERGROUP, 100)
+
+    async def get_dialogs(self):
+        for i, dialog in enumerate(list(self.dialogs)):
+            if i % self.DIALOG_PAGE_SIZE == 0:
+                # Pyrogram 以每頁 100 個對話分批讀取
+                self.calls["get_dialogs_page"] = self.calls.get("get_dialogs_page", 0) + 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+            yield dialog
+
+    async def get_messages(self, chat_id, message_id):
+        await self._call("get_messages", chat_id)
+        return FakeMessage(self, FakeChat(chat_id, "Source", ChatType.SUPERGROUP), message_id)
+
+    async def get_media_group(self, chat_id, message_id):
+        await self._call("get_media_group", chat_id)
+        return []
+
+    async def send_media_group(self, chat_id, media):
+        await self._call("send_media_group", chat_id)
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        await self._call("copy_message", chat_id)
+
+    async def copy_media_group(self, chat_id, from_chat_id, message_id, **kwargs):
+        await self._call("copy_media_group", chat_id)
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call("send_message", chat_id)
+        return FakeMessage(self, FakeChat(chat_id, "Chat", ChatType.SUPERGROUP), 1, text=text)
+
+    async def get_chat_history(self, chat_id, limit: int = 0):
+        await self._call("get_chat_history", chat_id)
+        # 模擬目標聊天中沒有任何本帳號發出的訊息
+        for message in []:
+            yield message
@@ -0,0 +1,229 @@
+# 檔案：benchmarks/run_benchmarks.py
+# 職責：離線基準測試，以模擬客戶端驅動推播、掃描、群組資訊、統計與日誌寫入，
+#       並輸出機器可讀的 JSON 報告，方便比對前後版本找出效能退化。
+#
+# 用法 (於專案根目錄執行)：
+#   python -m benchmarks.run_benchmarks --report bench_report.json
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import config
+from data.data_manager import DataManager
+import services.broadcast_service as broadcast_service
+import services.info_service as info_service
+import services.job_service as job_service_module
+from services.job_service import BroadcastJobService
+from services.account_pool import AccountPool
+from services.chat_cache import chat_cache
+from services.rate_limiter import RateLimiter
+from .fake_client import FakeClient
+
+def _result(name: str, seconds: float, ops: int, **extra) -> dict:
+    return {
+        'name': name,
+        'seconds': round(seconds, 6),
+        'ops': ops,
+        'ops_per_sec': round(ops / seconds, 2) if seconds > 0 else None,
+        **extra
+    }
+
+async def _setup_accounts(args) -> list:
+    """建立模擬帳號並替換推播使用的帳號池與速率控制器，返回所有模擬客戶端 (第一個為主帳號)。"""
+    clients = [
+        FakeClient(latency=args.latency, flood_rate=args.flood_rate, flood_wait=args.flood_wait,
+                   invalid_rate=args.invalid_rate, dialog_count=args.targets, seed=args.seed + i)
+        for i in range(max(args.accounts, 1))
+    ]
+    # 使用基準測試專用的速率設定，避免測到的是預設的保守速率；每個帳號各自有一份速率預算
+    broadcast_service.rate_limiter = RateLimiter(args.global_rate, args.global_burst, args.per_chat_interval)
+    pool = AccountPool()
+    pool.add("account0", clients[0], broadcast_service.rate_limiter, primary=True)
+    for i, extra in enumerate(clients[1:], start=1):
+        pool.add(f"account{i}", extra, RateLimiter(args.global_rate, args.global_burst, args.per_chat_interval))
+    await pool.refresh_membership()
+    broadcast_service.account_pool = pool
+    job_service_module.account_pool = pool
+    return clients
+
+class LoopStallMonitor:
+    """量測事件迴圈最長的停頓時間 (例如在事件迴圈中序列化大量資料)。"""
+
+    def __init__(self, tick: float = 0.001):
+        self.tick = tick
+        self.max_stall = 0.0
+        self._task = None
+
+    async def _run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.tick)
+            self.max_stall = max(self.max_stall, time.perf_counter() - started - self.tick)
+
+    def __enter__(self):
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    def __exit__(self, *exc):
+        self._task.cancel()
+
+async def bench_broadcast(args) -> dict:
+    clients = await _setup_accounts(args)
+    targets = [str(-1000000000000 - i) for i in range(args.targets)]
+    started = time.perf_counter()
+    success, failed = await broadcast_service.broadcast_to_targets(clients[0], targets, clients[0].make_message())
+    elapsed = time.perf_counter() - started
+    api_calls = {}
+    for fake in clients:
+        for method, count in fake.calls.items():
+            api_calls[method] = api_calls.get(method, 0) + count
+    return _result('broadcast_to_targets', elapsed, len(targets), success=success, failed=failed,
+                   accounts=len(clients), api_calls=api_calls)
+
+async def bench_broadcast_job(args) -> dict:
+    """
+    經由 BroadcastJobService.run_job 的完整推播路徑 (每個目標的檢查點與發送帳本)，
+    資料中預先放入 --job-history 筆已結束的工作，確認推播速度不受歷史紀錄大小影響。
+    """
+    clients = await _setup_accounts(args)
+    targets = [str(-1000000000000 - i) for i in range(args.targets)]
+    workdir = tempfile.mkdtemp(prefix='bench-job-')
+    try:
+        data_manager = DataManager(os.path.join(workdir, 'data.json'), save_delay=args.save_delay)
+        for i in range(args.job_history):
+            job_id = data_manager.add_broadcast_job({
+                'status': 'done', 'source_chat_id': -100, 'source_message_id': i, 'target_name': "history",
+                'targets': {t: {'status': 'sent', 'time': datetime.now().isoformat()} for t in targets}
+            })
+            data_manager.finish_broadcast_job(job_id, args.job_history)
+        data_manager.start()
+        await data_manager.flush()
+
+        job_service = BroadcastJobService(clients[0], data_manager)
+        message = clients[0].make_message(f"job benchmark {time.time()}")
+        job = job_service.create_job(message, targets, "benchmark")
+        with LoopStallMonitor() as monitor:
+            started = time.perf_counter()
+            success, failed = await job_service.run_job(job, message)
+            elapsed = time.perf_counter() - started
+        await data_manager.close()
+        files = {name: os.path.getsize(os.path.join(workdir, name)) for name in os.listdir(workdir)}
+        return _result('broadcast_job', elapsed, len(targets), success=success, failed=failed,
+                       job_history=args.job_history, max_loop_stall_ms=round(monitor.max_stall * 1000, 2), file_bytes=files)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+async def bench_scan(args) -> list:
+    client = FakeClient(latency=args.latency, dialog_count=args.dialogs, seed=args.seed)
+    workdir = tempfile.mkdtemp(prefix='bench-scan-')
+    try:
+        data_manager = DataManager(os.path.join(workdir, 'data.json'))
+        started = time.perf_counter()
+        dialogs = await info_service.scan_all_dialogs(client, data_manager, full=True)
+        full = _result('scan_all_dialogs_full', time.perf_counter() - started, args.dialogs, found=len(dialogs), api_calls=dict(client.calls))
+
+        client.calls.clear()
+        client.bump_dialogs(args.dialog_changes)
+        started = time.perf_counter()
+        dialogs = await info_service.scan_all_dialogs(client, data_manager)
+        incremental = _result('scan_all_dialogs_incremental', time.perf_counter() - started, args.dialogs,
+                              changed=args.dialog_changes, found=len(dialogs), api_calls=dict(client.calls))
+        return [full, incremental]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+async def bench_channel_details(args) -> list:
+    client = FakeClient(latency=args.latency, invalid_rate=args.invalid_rate, seed=args.seed)
+    targets = [str(-1000000000000 - i) for i in range(args.targets)]
+    chat_cache.invalidate()
+    started = time.perf_counter()
+    await info_service.get_all_channel_details(client, targets)
+    cold = _result('get_all_channel_details_cold', time.perf_counter() - started, len(targets), api_calls=dict(client.calls))
+
+    client.calls.clear()
+    started = time.perf_counter()
+    await info_service.get_all_channel_details(client, targets)
+    warm = _result('get_all_channel_details_warm', time.perf_counter() - started, len(targets), api_calls=dict(client.calls))
+    return [cold, warm]
+
+async def bench_data_manager(args) -> list:
+    workdir = tempfile.mkdtemp(prefix='bench-data-')
+    try:
+        results = []
+        data_manager = DataManager(os.path.join(workdir, 'data.json'), save_delay=args.save_delay)
+        data_manager.start()
+        started = time.perf_counter()
+        for i in range(args.logs):
+            data_manager.add_log('benchmark', 'INFO', f"log {i}")
+        enqueue = time.perf_counter() - started
+        started = time.perf_counter()
+        await data_manager.flush()
+        results.append(_result('data_manager_add_log', enqueue, args.logs, flush_seconds=round(time.perf_counter() - started, 6)))
+
+        iterations = 1000
+        started = time.perf_counter()
+        for _ in range(iterations):
+            await info_service.get_system_stats(data_manager)
+        results.append(_result('get_system_stats', time.perf_counter() - started, iterations, log_count=len(data_manager.get_logs())))
+        await data_manager.close()
+
+        started = time.perf_counter()
+        DataManager(os.path.join(workdir, 'data.json'))
+        results.append(_result('data_manager_load', time.perf_counter() - started, 1, log_count=args.logs))
+        return results
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+async def run(args) -> dict:
+    results = [await bench_broadcast(args), await bench_broadcast_job(args)]
+    results += await bench_scan(args)
+    results += await bench_channel_details(args)
+    results += await bench_data_manager(args)
+    return {
+        'generated_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'params': vars(args),
+        'results': results
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="RG Userbot 離線基準測試")
+    parser.add_argument('--report', default='bench_report.json', help="JSON 報告輸出路徑")
+    parser.add_argument('--targets', type=int, default=1000, help="推播與群組資訊的目標數")
+    parser.add_argument('--dialogs', type=int, default=5000, help="模擬帳號中的對話數")
+    parser.add_argument('--dialog-changes', type=int, default=20, help="增量掃描前有新訊息的對話數")
+    parser.add_argument('--logs', type=int, default=10000, help="寫入的日誌筆數")
+    parser.add_argument('--latency', type=float, default=0.005, help="每次 API 呼叫的模擬延遲 (秒)")
+    parser.add_argument('--flood-rate', type=float, default=0.001, help="FloodWait 發生機率")
+    parser.add_argument('--flood-wait', type=int, default=1, help="FloodWait 等待秒數")
+    parser.add_argument('--invalid-rate', type=float, default=0.01, help="PeerIdInvalid 發生機率")
+    parser.add_argument('--global-rate', type=float, default=config.BROADCAST_GLOBAL_RATE * 50, help="推播全域速率 (次/秒)")
+    parser.add_argument('--global-burst', type=int, default=config.BROADCAST_GLOBAL_BURST, help="推播全域突發量")
+    parser.add_argument('--job-history', type=int, default=config.BROADCAST_JOB_HISTORY - 1, help="推播工作基準測試前已有的已結束工作數")
+    parser.add_argument('--accounts', type=int, default=1, help="推播使用的模擬帳號數")
+    parser.add_argument('--per-chat-interval', type=float, default=0.0, help="同一群組的最短發送間隔 (秒)")
+    parser.add_argument('--save-delay', type=float, default=config.DATA_SAVE_DELAY, help="DataManager 延遲寫入秒數")
+    parser.add_argument('--seed', type=int, default=0, help="隨機種子，固定後結果可重現")
+    parser.add_argument('--log-level', default='CRITICAL', help="執行期間的日誌等級 (注入的錯誤會產生大量錯誤日誌)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+    report = asyncio.run(run(args))
+    with open(args.report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    for r in report['results']:
+        print(f"{r['name']:<32} {r['seconds']:>10.4f}s  {r['ops_per_sec'] or '-':>12} ops/s")
+    print(f"報告已寫入 {args.report}")
+
+if __name__ == '__main__':
+    main()
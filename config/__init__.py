@@ -28,6 +28,18 @@ def get_env_var(var_name, is_int=False, is_list=False, is_int_list=False):
     except (ValueError, TypeError) as e:
         raise ValueError(f"環境變數 '{var_name}' 的格式不正確。請檢查 .env 檔案。") from e
 
+def get_optional_env_var(var_name, default, cast=str):
+    """
+    讀取可選的環境變數，未設定時使用預設值；格式錯誤時同樣拋出清楚的錯誤。
+    """
+    value = os.environ.get(var_name)
+    if value is None or not value.strip():
+        return default
+    try:
+        return cast(value.strip())
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"環境變數 '{var_name}' 的格式不正確。請檢查 .env 檔案。") from e
+
 # --- 讀取所有設定 ---
 try:
     # --- Telegram API & User Account ---
@@ -55,3 +67,81 @@ if not TARGET_CHANNELS_STR:
 
 # --- 全域指令設定 ---
 COMMAND_PREFIX = "."
+
+# --- 推播速率設定 (皆為可選，未設定時使用預設值) ---
+# 同時進行中的發送數量上限
+BROADCAST_CONCURRENCY = get_optional_env_var("BROADCAST_CONCURRENCY", 5, int)
+# 全域令牌桶：每秒補充的發送次數與可累積的突發量
+BROADCAST_GLOBAL_RATE = get_optional_env_var("BROADCAST_GLOBAL_RATE", 20.0, float)
+BROADCAST_GLOBAL_BURST = get_optional_env_var("BROADCAST_GLOBAL_BURST", 20, int)
+# 同一個群組兩次發送之間的最短間隔 (秒)
+BROADCAST_PER_CHAT_INTERVAL = get_optional_env_var("BROADCAST_PER_CHAT_INTERVAL", 3.0, float)
+# 同一目標遇到 FloodWait 後最多重新排程的次數
+BROADCAST_FLOOD_RETRIES = get_optional_env_var("BROADCAST_FLOOD_RETRIES", 3, int)
+# 推播進度訊息的最短更新間隔 (秒)
+BROADCAST_PROGRESS_INTERVAL = get_optional_env_var("BROADCAST_PROGRESS_INTERVAL", 3.0, float)
+# 保留最近幾筆已結束的推播工作紀錄
+BROADCAST_JOB_HISTORY = get_optional_env_var("BROADCAST_JOB_HISTORY", 20, int)
+# 恢復中斷的工作時，檢查目標聊天最近幾則訊息以確認是否已送達
+BROADCAST_RESUME_HISTORY_LIMIT = get_optional_env_var("BROADCAST_RESUME_HISTORY_LIMIT", 20, int)
+# 其他推播工作在此秒數內已把相同內容送達同一群組時略過 (防止重複送出)；0 表示只防止同一工作內的重複發送
+BROADCAST_DEDUP_WINDOW = get_optional_env_var("BROADCAST_DEDUP_WINDOW", 600.0, float)
+# 發送帳本保留成功發送紀錄的時間 (秒)
+BROADCAST_LEDGER_TTL = get_optional_env_var("BROADCAST_LEDGER_TTL", 86400.0, float)
+
+# 額外推播帳號的 session 名稱 (以逗號分隔)，與主帳號共用 API_ID/API_HASH；
+# 首次使用需在終端機登入。額外帳號只會推播到自己已加入的群組，且必須能讀取控制群組的訊息
+EXTRA_SESSIONS = get_optional_env_var("EXTRA_SESSIONS", [], lambda v: [s.strip() for s in v.split(',') if s.strip()])
+
+# --- 目標登記表設定 ---
+# 背景重新解析目標並更新群組資訊的間隔 (秒)
+TARGET_REFRESH_INTERVAL = get_optional_env_var("TARGET_REFRESH_INTERVAL", 1800.0, float)
+# 群組人數與上次回報相差至少此數量時，才在健康檢查時回報到控制群組
+HEALTH_MIN_MEMBER_DELTA = get_optional_env_var("HEALTH_MIN_MEMBER_DELTA", 10, int)
+# 群組人數歷史 (每天最多一點) 的保留天數
+HEALTH_HISTORY_DAYS = get_optional_env_var("HEALTH_HISTORY_DAYS", 90, int)
+
+# --- 群組資訊快取設定 ---
+# 快取有效時間 (秒) 與最多保存的群組數量
+CHAT_CACHE_TTL = get_optional_env_var("CHAT_CACHE_TTL", 600.0, float)
+CHAT_CACHE_MAX_SIZE = get_optional_env_var("CHAT_CACHE_MAX_SIZE", 2000, int)
+# 查詢群組資訊失敗的結果只快取此秒數，之後會重新查詢
+CHAT_CACHE_ERROR_TTL = get_optional_env_var("CHAT_CACHE_ERROR_TTL", 30.0, float)
+# 快取未命中時，同時查詢群組資訊的數量上限
+CHAT_FETCH_CONCURRENCY = get_optional_env_var("CHAT_FETCH_CONCURRENCY", 10, int)
+
+# --- 資料儲存設定 ---
+# 修改後延遲多久 (秒) 才在背景寫入磁碟，期間的多次修改會合併成一次寫入
+DATA_SAVE_DELAY = get_optional_env_var("DATA_SAVE_DELAY", 1.0, float)
+# 儲存後端：'json' (data.json + 日誌檔) 或 'sqlite'；改用 sqlite 時首次啟動會自動匯入 data.json
+STORAGE_BACKEND = get_optional_env_var("STORAGE_BACKEND", "json", lambda v: v.lower())
+SQLITE_PATH = get_optional_env_var("SQLITE_PATH", "data.sqlite3")
+
+# --- 使用者狀態設定 ---
+# 操作狀態多久 (秒) 未使用即過期，以及最多保存的使用者數
+USER_STATE_TTL = get_optional_env_var("USER_STATE_TTL", 3600.0, float)
+USER_STATE_MAX_SIZE = get_optional_env_var("USER_STATE_MAX_SIZE", 100, int)
+# 未完成操作的保存檔，重啟後可繼續；設為空字串則只保存在記憶體中
+USER_STATE_FILE = get_optional_env_var("USER_STATE_FILE", "user_states.json")
+
+# --- 日誌保留設定 ---
+# 原始日誌保留天數與筆數上限，超過的部分併入每小時彙總 (依操作類型與狀態計數)
+LOG_RETENTION_DAYS = get_optional_env_var("LOG_RETENTION_DAYS", 30.0, float)
+LOG_MAX_ENTRIES = get_optional_env_var("LOG_MAX_ENTRIES", 20000, int)
+# 每小時彙總的保留天數
+LOG_ROLLUP_RETENTION_DAYS = get_optional_env_var("LOG_ROLLUP_RETENTION_DAYS", 365.0, float)
+# 背景壓縮的執行間隔 (秒)
+LOG_COMPACT_INTERVAL = get_optional_env_var("LOG_COMPACT_INTERVAL", 3600.0, float)
+
+# --- 排程設定 ---
+# 停機期間錯過的排程，在此秒數內重新啟動仍會補執行
+SCHEDULE_MISFIRE_GRACE = get_optional_env_var("SCHEDULE_MISFIRE_GRACE", 3600, int)
+# 每個排程執行時間加上的隨機延遲上限 (秒)，避免大量排程同時推播
+SCHEDULE_JITTER = get_optional_env_var("SCHEDULE_JITTER", 30, int)
+
+# --- 效能指標設定 ---
+# 是否收集效能指標 (1/0)；關閉時幾乎沒有額外成本
+METRICS_ENABLED = get_optional_env_var("METRICS_ENABLED", False, lambda v: v.lower() in ("1", "true", "yes", "on"))
+# 啟用時定期寫出的 Prometheus 文字檔路徑與間隔 (秒)
+METRICS_FILE = get_optional_env_var("METRICS_FILE", "metrics.prom")
+METRICS_INTERVAL = get_optional_env_var("METRICS_INTERVAL", 60.0, float)
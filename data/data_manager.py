@@ -1,39 +1,165 @@
 # 檔案：data/data_manager.py
-# 職責：資料庫核心 (Model)，所有JSON檔案的讀寫都由它負責。
+# 職責：資料庫核心 (Model)，所有資料的讀寫都由它負責。
+#       實際儲存交給可替換的後端 (見 data/storage.py)，所有寫入都透過 write-behind 在背景合併執行。
 
+import asyncio
 import json
 import logging
+import time
 from datetime import datetime
-from threading import Lock
+import metrics
+from .log_store import LogStore, LogRollups
+from .persistence import WriteBehindWriter
+from .storage import JsonStorage
 
 class DataManager:
-    """負責所有 data.json 的讀寫操作，確保多執行緒安全。"""
-
-    def __init__(self, db_path: str = 'data.json'):
-        self.db_path = db_path
-        self.lock = Lock()
-        self.data = self._load()
-
-    def _load(self) -> dict:
-        try:
-            with open(self.db_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            logging.warning(f"無法讀取 {self.db_path}，將建立新的資料檔案。")
-            return {'schedules': [], 'drafts': [], 'logs': [], 'broadcast_sets': []}
-
-    def _save(self):
-        with self.lock:
-            try:
-                with open(self.db_path, 'w', encoding='utf-8') as f:
-                    json.dump(self.data, f, ensure_ascii=False, indent=4)
-            except Exception as e:
-                logging.error(f"寫入資料到 {self.db_path} 失敗: {e}")
+    """
+    負責所有資料的存取，資料常駐記憶體並建立 id 索引。
+    修改只會標記為待寫入，由 WriteBehindWriter 在背景交給儲存後端；關閉前請呼叫 close()。
+    頻繁的小變更 (推播目標的狀態、發送帳本的新紀錄) 以 journal 紀錄附加寫入，不重寫整個區段；
+    journal 累積到 JOURNAL_COMPACT_THRESHOLD 筆或工作結束時，才把相關區段整段寫入並清空 journal。
+    """
+
+    JOURNAL_COMPACT_THRESHOLD = 5000
+    # 由 journal 紀錄修改的區段，清空 journal 時必須一併寫入
+    JOURNALED_SECTIONS = ('broadcast_jobs', 'send_ledger')
+
+    def __init__(self, db_path: str = 'data.json', log_path: str = None, save_delay: float = 1.0, storage=None):
+        self.storage = storage or JsonStorage(db_path, log_path)
+        self.data, logs, journal = self.storage.load()
+        self.rollups = LogRollups(self.data.setdefault('log_rollups', {}))
+        self.log_store = LogStore(logs)
+        # 壓縮途中中斷時，日誌檔可能仍留有已併入彙總的紀錄，直接略過
+        self.log_store.drop_before(self.rollups.until)
+        self._dirty_sections = set()
+        self._pending_logs = []
+        self._pending_journal = []
+        self._indexes = {}   # 區段名稱 -> {欄位: {值: 項目}}
+        self._next_ids = {}  # 區段名稱 -> 下一個可用 id
+        self.versions = {}   # 區段名稱 (及 'logs') -> 變更次數，供面板快取判斷資料是否改變
+        self.writer = WriteBehindWriter(self._snapshot, self._write_snapshot, self._restore_snapshot, delay=save_delay, name=type(self.storage).__name__)
+        self._archive_finished_jobs()
+        for record in journal:
+            self._apply_journal(record)
+        self._journal_count = len(journal)
+        self._reset_journal = False
+        if self._dirty_sections:
+            # 載入時搬移的資料在背景任務啟動後寫入
+            self.writer.dirty = True
+
+    def start(self):
+        """啟動背景寫入任務，需在事件迴圈中呼叫。"""
+        self.writer.start()
+
+    async def flush(self):
+        """立即把所有待寫入的資料寫入磁碟。"""
+        await self.writer.flush()
+
+    async def close(self):
+        """停止背景寫入任務、寫入剩餘資料並關閉儲存後端，程式結束前呼叫。"""
+        await self.writer.stop()
+        self.storage.close()
+
+    def _save(self, key: str = None):
+        """標記區段已變更 (未指定時為全部區段)，實際寫入由背景任務合併處理。"""
+        keys = [key] if key else list(self.data)
+        for k in keys:
+            self._dirty_sections.add(k)
+            self._indexes.pop(k, None)
+            self.versions[k] = self.versions.get(k, 0) + 1
+        self.writer.mark_dirty()
+
+    def get_version(self, *keys: str) -> tuple:
+        """返回指定區段目前的版本號；任何修改都會讓版本號改變。"""
+        return tuple(self.versions.get(k, 0) for k in keys)
+
+    # --- Write-behind 快照與寫入 ---
+    def _snapshot(self) -> tuple:
+        """
+        在事件迴圈中取得一致的快照：變更過的區段 (序列化為 JSON 字串)、待寫入的日誌與 journal 紀錄。
+        需要清空 journal 時，快照中的區段已包含所有 journal 紀錄的結果，待寫入的紀錄不必再附加。
+        """
+        reset_journal, self._reset_journal = self._reset_journal, False
+        if reset_journal:
+            self._dirty_sections.update(k for k in self.JOURNALED_SECTIONS if k in self.data)
+            self._pending_journal = []
+            self._journal_count = 0
+        sections = {k: json.dumps(self.data.get(k), ensure_ascii=False, separators=(',', ':')) for k in self._dirty_sections}
+        pending_logs, self._pending_logs = self._pending_logs, []
+        pending_journal, self._pending_journal = self._pending_journal, []
+        self._dirty_sections = set()
+        return sections, pending_logs, pending_journal, reset_journal
+
+    def _restore_snapshot(self, snapshot: tuple):
+        sections, pending_logs, pending_journal, reset_journal = snapshot
+        self._pending_logs[:0] = pending_logs
+        self._pending_journal[:0] = pending_journal
+        # 區段只需重新標記，下次快照會序列化最新內容
+        self._dirty_sections.update(sections)
+        self._reset_journal = self._reset_journal or reset_journal
+
+    def _write_snapshot(self, snapshot: tuple):
+        """在背景執行緒中執行，交由儲存後端寫入。"""
+        sections, pending_logs, pending_journal, reset_journal = snapshot
+        self.storage.write(sections, pending_logs, pending_journal, reset_journal)
+
+    # --- Journal (附加寫入的小變更) ---
+    def _journal(self, record: dict):
+        self._pending_journal.append(record)
+        self._journal_count += 1
+        if self._journal_count >= self.JOURNAL_COMPACT_THRESHOLD:
+            self.compact_journal()
+        self.writer.mark_dirty()
+
+    def _apply_journal(self, record: dict):
+        """啟動時重播一筆 journal 紀錄；對應的工作已結束或不存在時略過。"""
+        if record.get('type') == 'job_target':
+            job = self._index('broadcast_jobs').get(record['job'])
+            if job is not None:
+                job['targets'][record['target']] = {'status': record['status'], 'time': record['time']}
+                job['updated_at'] = record['time']
+        elif record.get('type') == 'ledger':
+            self.data.setdefault('send_ledger', {})[record['key']] = record['entry']
+
+    def compact_journal(self):
+        """下次寫入時把 journal 修改過的區段整段寫入，並清空 journal。"""
+        self._reset_journal = True
+        self.writer.mark_dirty()
+
+    # --- 區段索引 ---
+    def _index(self, key: str, field: str = 'id') -> dict:
+        """以指定欄位 (預設為 id) 為鍵的索引，區段變更時自動失效並於下次查詢時重建。"""
+        indexes = self._indexes.setdefault(key, {})
+        index = indexes.get(field)
+        if index is None:
+            index = {item.get(field): item for item in self.data.get(key, [])}
+            indexes[field] = index
+        return index
 
     def _get_next_id(self, key: str) -> int:
-        if not self.data.get(key):
-            return 1
-        return max((item.get('id', 0) for item in self.data[key]), default=0) + 1
+        if key not in self._next_ids:
+            self._next_ids[key] = max((item.get('id', 0) for item in self.data.get(key, [])), default=0) + 1
+        next_id = self._next_ids[key]
+        self._next_ids[key] = next_id + 1
+        return next_id
+
+    def _add_record(self, key: str, record: dict) -> int:
+        record['id'] = self._get_next_id(key)
+        self.data.setdefault(key, []).append(record)
+        self._save(key)
+        return record['id']
+
+    def _update_record(self, key: str, record_id: int, **fields) -> bool:
+        record = self._index(key).get(record_id)
+        if record is None:
+            return False
+        record.update(fields)
+        self._save(key)
+        return True
+
+    def _delete_record(self, key: str, record_id: int):
+        self.data[key] = [r for r in self.data.get(key, []) if r.get('id') != record_id]
+        self._save(key)
 
     # --- Log Management (日誌管理) ---
     def add_log(self, action: str, status: str, message: str, user: str = "System"):
@@ -51,37 +177,231 @@ class DataManager:
             'message': message,
             'user': user
         }
-        self.data.get('logs', []).append(log_entry)
-        self._save()
+        self.log_store.add(log_entry)
+        self._pending_logs.append(log_entry)
+        self.versions['logs'] = self.versions.get('logs', 0) + 1
+        self.writer.mark_dirty()
         logging.info(f"Log [{status}] added: {action} - {message}")
 
     def get_logs(self) -> list:
-        """獲取所有日誌記錄。"""
-        return self.data.get('logs', [])
+        """獲取所有日誌記錄 (依時間排序)。"""
+        return self.log_store.entries
+
+    def get_logs_since(self, since: datetime) -> list:
+        """獲取指定時間之後的日誌記錄。"""
+        return self.log_store.since(since)
+
+    def count_recent_logs(self, action: str = None) -> int:
+        """最近 24 小時內的日誌數量，由滾動計數器直接提供，不需掃描歷史紀錄。"""
+        return self.log_store.count_24h(action)
+
+    def count_logs(self, since: datetime, action: str = None, status: str = None) -> int:
+        """
+        指定時間之後的日誌數量，可依 action/status 篩選。
+        已壓縮的部分讀取每小時彙總 (以小時為單位)，其餘計算保留的原始日誌。
+        """
+        since_ts = since.timestamp()
+        if since_ts < self.rollups.until:
+            # 彙總只包含早於 until 的日誌，時間剛好等於 until 的日誌仍保留在原始日誌中
+            total = self.rollups.count(since_ts, action, status)
+            return total + self.log_store.count(start=self.rollups.until, start_inclusive=True, action=action, status=status)
+        return self.log_store.count(start=since_ts, action=action, status=status)
+
+    def query_logs(self, action: str = None, status: str = None, user: str = None,
+                   since: datetime = None, until: datetime = None, offset: int = 0, limit: int = 10) -> tuple:
+        """
+        日誌瀏覽用的篩選查詢 (只查詢保留的原始日誌)，返回 (由新到舊的一頁日誌, 符合總數)。
+        使用 LogStore 的次要索引，每頁只是一次索引查詢加上切片。
+        """
+        return self.log_store.query(
+            start=since.timestamp() if since else None, end=until.timestamp() if until else None,
+            offset=offset, limit=limit, action=action, status=status, user=user
+        )
+
+    def get_log_values(self, field: str) -> list:
+        """返回日誌中 action、status 或 user 欄位出現過的所有值，供篩選選單使用。"""
+        return self.log_store.values(field)
+
+    async def compact_logs(self, retention_seconds: float, max_entries: int, rollup_retention_seconds: float) -> int:
+        """
+        日誌保留與壓縮：早於 retention_seconds 或超出 max_entries 筆的原始日誌併入每小時彙總
+        (依 action 與 status 計數) 後刪除，超過 rollup_retention_seconds 的彙總也一併刪除。
+        先寫入彙總再刪除日誌檔中的紀錄，中途中斷也不會重複計算。返回壓縮的日誌筆數。
+        """
+        started = time.perf_counter()
+        now = datetime.now().timestamp()
+        cutoff = now - retention_seconds
+        if max_entries > 0 and len(self.log_store) > max_entries:
+            cutoff = max(cutoff, self.log_store.times[len(self.log_store) - max_entries])
+        removed = self.log_store.drop_before(cutoff) if cutoff > self.rollups.until else []
+        if removed:
+            self.rollups.fold(removed, cutoff)
+        pruned_hours = self.rollups.prune(now - rollup_retention_seconds)
+        if not removed and not pruned_hours:
+            return 0
+
+        self._save('log_rollups')
+        self.versions['logs'] = self.versions.get('logs', 0) + 1
+        await self.flush()
+        if removed:
+            await asyncio.to_thread(self.storage.prune_logs, self.rollups.until)
+        metrics.observe('log_compaction_seconds', time.perf_counter() - started)
+        logging.info(f"日誌壓縮完成：{len(removed)} 筆日誌併入每小時彙總，刪除 {pruned_hours} 小時的過期彙總，保留 {len(self.log_store)} 筆原始日誌。")
+        return len(removed)
 
     # --- Broadcast Set Management (推播組合管理) ---
     def get_broadcast_sets(self):
         return self.data.get('broadcast_sets', [])
 
     def get_broadcast_set_by_id(self, set_id: int):
-        for s in self.data.get('broadcast_sets', []):
-            if s.get('id') == set_id:
-                return s
-        return None
+        return self._index('broadcast_sets').get(set_id)
 
     def save_broadcast_set(self, set_name: str, channel_ids: list, set_id: int = None):
-        sets = self.data.get('broadcast_sets', [])
+        sets = self.data.setdefault('broadcast_sets', [])
         if set_id is None:
             new_id = self._get_next_id('broadcast_sets')
             sets.append({'id': new_id, 'name': set_name, 'channels': channel_ids})
         else:
-            for s in sets:
-                if s.get('id') == set_id:
-                    s['name'], s['channels'] = set_name, channel_ids
-                    break
-        self._save()
+            s = self.get_broadcast_set_by_id(set_id)
+            if s:
+                s['name'], s['channels'] = set_name, channel_ids
+        self._save('broadcast_sets')
 
     def delete_broadcast_set(self, set_id: int):
         sets = self.data.get('broadcast_sets', [])
         self.data['broadcast_sets'] = [s for s in sets if s.get('id') != set_id]
-        self._save()
+        self._save('broadcast_sets')
+
+    # --- Draft Management (草稿管理) ---
+    # 草稿只保存來源訊息的位置與內容雜湊，不複製訊息內容；相同內容的草稿只會保存一份。
+    def get_drafts(self) -> list:
+        return self.data.get('drafts', [])
+
+    def get_draft_by_id(self, draft_id: int):
+        return self._index('drafts').get(draft_id)
+
+    def find_draft_by_hash(self, content_hash: str):
+        return self._index('drafts', 'content_hash').get(content_hash)
+
+    def add_draft(self, draft: dict) -> int:
+        return self._add_record('drafts', draft)
+
+    def delete_draft(self, draft_id: int):
+        self._delete_record('drafts', draft_id)
+
+    # --- Schedule Management (排程管理) ---
+    def get_schedules(self) -> list:
+        return self.data.get('schedules', [])
+
+    def get_schedule_by_id(self, schedule_id: int):
+        return self._index('schedules').get(schedule_id)
+
+    def add_schedule(self, schedule: dict) -> int:
+        """新增排程並返回其 id。"""
+        return self._add_record('schedules', schedule)
+
+    def update_schedule(self, schedule_id: int, **fields) -> bool:
+        return self._update_record('schedules', schedule_id, **fields)
+
+    def delete_schedule(self, schedule_id: int):
+        self._delete_record('schedules', schedule_id)
+
+    # --- Broadcast Job Management (推播工作管理) ---
+    # 'broadcast_jobs' 只保存執行中的工作，已結束的工作移到 'broadcast_job_history'，
+    # 推播期間需要寫入的區段大小因此與歷史紀錄無關。
+    def get_broadcast_jobs(self) -> list:
+        """返回執行中 (包括中斷後待恢復) 的工作。"""
+        return self.data.get('broadcast_jobs', [])
+
+    def get_broadcast_job_history(self) -> list:
+        return self.data.get('broadcast_job_history', [])
+
+    def get_broadcast_job_by_id(self, job_id: int):
+        return self._index('broadcast_jobs').get(job_id) or self._index('broadcast_job_history').get(job_id)
+
+    def add_broadcast_job(self, job: dict) -> int:
+        if 'broadcast_jobs' not in self._next_ids:
+            # 工作編號也用於發送帳本，歷史紀錄被刪除後也不能重複使用
+            used = [j['id'] for j in self.get_broadcast_jobs() + self.get_broadcast_job_history()]
+            self._next_ids['broadcast_jobs'] = max(used + [self.data.get('broadcast_job_seq', 0)]) + 1
+        job_id = self._add_record('broadcast_jobs', job)
+        self.data['broadcast_job_seq'] = job_id
+        self._save('broadcast_job_seq')
+        return job_id
+
+    def update_broadcast_job(self, job_id: int, **fields) -> bool:
+        """更新推播工作；只傳入 job_id 時代表工作內容已在原處修改，僅標記待寫入。"""
+        return self._update_record('broadcast_jobs', job_id, **fields)
+
+    def update_job_target(self, job_id: int, target: str, status: str):
+        """更新工作中單一目標的狀態，只附加一筆 journal 紀錄，不重寫整個區段。"""
+        job = self._index('broadcast_jobs').get(job_id)
+        if job is None:
+            return
+        now = datetime.now().isoformat()
+        job['targets'][target] = {'status': status, 'time': now}
+        job['updated_at'] = now
+        self._journal({'type': 'job_target', 'job': job_id, 'target': target, 'status': status, 'time': now})
+
+    def finish_broadcast_job(self, job_id: int, keep: int):
+        """把已結束的工作移到歷史紀錄 (只保留最近 keep 筆)，並清空 journal。"""
+        job = self._index('broadcast_jobs').get(job_id)
+        if job is None:
+            return
+        self.data['broadcast_jobs'] = [j for j in self.get_broadcast_jobs() if j['id'] != job_id]
+        history = self.data.setdefault('broadcast_job_history', [])
+        history.append(job)
+        del history[:max(len(history) - keep, 0)]
+        self._save('broadcast_jobs')
+        self._save('broadcast_job_history')
+        self.compact_journal()
+
+    def _archive_finished_jobs(self):
+        """舊版把已結束的工作也存在 'broadcast_jobs'，載入時移到歷史紀錄。"""
+        jobs = self.data.get('broadcast_jobs', [])
+        finished = [j for j in jobs if j.get('status') != 'running']
+        if finished:
+            self.data['broadcast_jobs'] = [j for j in jobs if j.get('status') == 'running']
+            self.data.setdefault('broadcast_job_history', []).extend(finished)
+            self._dirty_sections.update(('broadcast_jobs', 'broadcast_job_history'))
+
+    # --- Dialog Snapshot (對話掃描快照) ---
+    def get_dialog_snapshot(self):
+        """返回上次掃描保存的對話快照，從未掃描過時為 None。"""
+        return self.data.get('dialog_snapshot')
+
+    def save_dialog_snapshot(self, snapshot: dict):
+        self.data['dialog_snapshot'] = snapshot
+        self._save('dialog_snapshot')
+
+    # --- Rate State (自適應速率控制學到的速率) ---
+    def get_rate_state(self) -> dict:
+        return self.data.get('rate_state') or {}
+
+    def save_rate_state(self, state: dict):
+        if state == self.data.get('rate_state'):
+            return
+        self.data['rate_state'] = state
+        self._save('rate_state')
+
+    # --- Channel Health (群組健康監控，見 services/health_monitor.py) ---
+    def get_channel_health(self) -> dict:
+        return self.data.get('channel_health') or {}
+
+    def save_channel_health(self, health: dict):
+        self.data['channel_health'] = health
+        self._save('channel_health')
+
+    # --- Send Ledger (推播發送帳本) ---
+    def get_send_ledger(self) -> dict:
+        return self.data.get('send_ledger') or {}
+
+    def save_send_ledger(self, entries: dict):
+        """entries 為帳本本身 (通常是同一個物件)，整段寫入 (包括已淘汰的紀錄)；只在工作結束時呼叫。"""
+        self.data['send_ledger'] = entries
+        self._save('send_ledger')
+
+    def record_send(self, key: str, entry: list):
+        """記錄一筆新的成功發送，只附加一筆 journal 紀錄，不重寫整個帳本。"""
+        self.data.setdefault('send_ledger', {})[key] = entry
+        self._journal({'type': 'ledger', 'key': key, 'entry': entry})
@@ -0,0 +1,239 @@
+# 檔案：data/log_store.py
+# 職責：日誌的記憶體索引，依時間排序並維護滾動時間窗內的計數與各欄位的次要索引；
+#       以及舊日誌壓縮後的每小時彙總 (LogRollups)。
+
+import bisect
+import logging
+from collections import deque
+from datetime import datetime
+
+def parse_log_time(log_entry: dict) -> float:
+    """把日誌的 ISO 時間轉成 timestamp；格式錯誤時視為最舊的紀錄。"""
+    try:
+        return datetime.fromisoformat(log_entry['time']).timestamp()
+    except (KeyError, TypeError, ValueError):
+        logging.warning(f"日誌時間格式錯誤，將視為最舊的紀錄: {log_entry}")
+        return 0.0
+
+class RollingCounter:
+    """
+    滾動時間窗計數器：新增時 O(1)，查詢時只淘汰已過期的紀錄 (攤銷 O(1))。
+    同時維護總數與每個 action 的計數。紀錄依時間排序，較舊的紀錄晚到時插入到對應的位置。
+    """
+
+    def __init__(self, window_seconds: float):
+        self.window_seconds = window_seconds
+        self.events = deque()  # (timestamp, action)，依時間排序
+        self.total = 0
+        self.by_action = {}
+
+    def add(self, timestamp: float, action: str):
+        if self.events and timestamp < self.events[-1][0]:
+            # 系統時間被調整或日誌順序錯亂時才會發生，從新的一端往回找插入位置，
+            # 淘汰時才能一路從最舊的一端移除，不會有過期的紀錄卡在較新的紀錄後面
+            pos = len(self.events)
+            while pos and self.events[pos - 1][0] > timestamp:
+                pos -= 1
+            self.events.insert(pos, (timestamp, action))
+        else:
+            self.events.append((timestamp, action))
+        self.total += 1
+        self.by_action[action] = self.by_action.get(action, 0) + 1
+
+    def _evict(self, now: float):
+        cutoff = now - self.window_seconds
+        while self.events and self.events[0][0] <= cutoff:
+            _, action = self.events.popleft()
+            self.total -= 1
+            self.by_action[action] -= 1
+            if not self.by_action[action]:
+                del self.by_action[action]
+
+    def count(self, now: float, action: str = None) -> int:
+        self._evict(now)
+        if action is None:
+            return self.total
+        return self.by_action.get(action, 0)
+
+class TimeIndex:
+    """依時間排序的 (timestamp, 日誌) 清單，支援二分搜尋的時間區間查詢與刪除最舊的部分。"""
+
+    def __init__(self):
+        self.times = []
+        self.entries = []
+
+    def add(self, timestamp: float, entry: dict):
+        if self.times and timestamp < self.times[-1]:
+            # 系統時間被調整時才可能發生，維持排序以保證二分搜尋正確
+            pos = bisect.bisect_right(self.times, timestamp)
+            self.times.insert(pos, timestamp)
+            self.entries.insert(pos, entry)
+        else:
+            self.times.append(timestamp)
+            self.entries.append(entry)
+
+    def bounds(self, start: float = None, end: float = None, start_inclusive: bool = False) -> tuple:
+        """返回時間在 (start, end] 內的日誌位置範圍 [lo, hi)；start_inclusive 時為 [start, end]。"""
+        lo = (bisect.bisect_left if start_inclusive else bisect.bisect_right)(self.times, start) if start is not None else 0
+        hi = bisect.bisect_right(self.times, end) if end is not None else len(self.times)
+        return lo, max(lo, hi)
+
+    def drop_before(self, timestamp: float) -> int:
+        pos = bisect.bisect_left(self.times, timestamp)
+        del self.times[:pos]
+        del self.entries[:pos]
+        return pos
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+class LogStore:
+    """
+    依時間排序保存所有日誌，並提供時間區間查詢與 24 小時滾動計數。
+    另外為 action、status、user 各自維護依時間排序的次要索引，
+    篩選查詢只需查表加上二分搜尋，不必掃描全部歷史紀錄。
+    """
+
+    WINDOW_24H = 24 * 60 * 60
+    INDEXED_FIELDS = ('action', 'status', 'user')
+
+    def __init__(self, entries: list = None):
+        self.all = TimeIndex()
+        self.indexes = {field: {} for field in self.INDEXED_FIELDS}  # 欄位 -> {值: TimeIndex}
+        self.counter_24h = RollingCounter(self.WINDOW_24H)
+        indexed = sorted(((parse_log_time(e), e) for e in entries or []), key=lambda item: item[0])
+        for timestamp, entry in indexed:
+            self._append(timestamp, entry)
+
+    @property
+    def entries(self) -> list:
+        return self.all.entries
+
+    @property
+    def times(self) -> list:
+        return self.all.times
+
+    def _append(self, timestamp: float, entry: dict):
+        self.all.add(timestamp, entry)
+        for field, index in self.indexes.items():
+            value = entry.get(field)
+            if value is not None:
+                index.setdefault(value, TimeIndex()).add(timestamp, entry)
+        if timestamp > datetime.now().timestamp() - self.WINDOW_24H:
+            self.counter_24h.add(timestamp, entry.get('action'))
+
+    def add(self, entry: dict):
+        self._append(parse_log_time(entry), entry)
+
+    def __len__(self) -> int:
+        return len(self.all)
+
+    def drop_before(self, timestamp: float) -> list:
+        """移除早於 timestamp 的日誌，返回被移除的 (timestamp, 日誌) 列表。"""
+        pos = bisect.bisect_left(self.all.times, timestamp)
+        removed = list(zip(self.all.times[:pos], self.all.entries[:pos]))
+        self.all.drop_before(timestamp)
+        for index in self.indexes.values():
+            for value in list(index):
+                index[value].drop_before(timestamp)
+                if not index[value]:
+                    del index[value]
+        return removed
+
+    def since(self, since: datetime) -> list:
+        """返回指定時間之後的日誌 (以二分搜尋定位)。"""
+        pos = bisect.bisect_right(self.times, since.timestamp())
+        return self.entries[pos:]
+
+    def values(self, field: str) -> list:
+        """返回某個索引欄位目前出現過的所有值 (排序後)。"""
+        return sorted(self.indexes[field], key=str)
+
+    def query(self, start: float = None, end: float = None, offset: int = 0, limit: int = None,
+              start_inclusive: bool = False, **filters) -> tuple:
+        """
+        依時間區間 (start, end] (start_inclusive 時為 [start, end]) 與 action/status/user 篩選，返回 (由新到舊的一頁日誌, 符合總數)。
+        只有一個篩選條件時直接使用該欄位的索引切片；多個條件時從最小的索引開始比對其餘條件。
+        """
+        filters = {field: value for field, value in filters.items() if value is not None}
+        candidates = []
+        for field, value in filters.items():
+            index = self.indexes[field].get(value)
+            if index is None:
+                return [], 0
+            candidates.append((len(index), field, index))
+        if candidates:
+            _, base_field, base = min(candidates, key=lambda item: item[0])
+        else:
+            base_field, base = None, self.all
+        lo, hi = base.bounds(start, end, start_inclusive)
+        rest = {field: value for field, value in filters.items() if field != base_field}
+
+        if not rest:
+            total = hi - lo
+            stop = hi - offset
+            begin = max(lo, stop - limit) if limit is not None else lo
+            return base.entries[begin:max(stop, lo)][::-1], total
+
+        matched = [e for e in reversed(base.entries[lo:hi]) if all(e.get(f) == v for f, v in rest.items())]
+        page = matched[offset:offset + limit] if limit is not None else matched[offset:]
+        return page, len(matched)
+
+    def count(self, start: float = None, start_inclusive: bool = False, **filters) -> int:
+        return self.query(start=start, limit=0, start_inclusive=start_inclusive, **filters)[1]
+
+    def count_24h(self, action: str = None) -> int:
+        """返回最近 24 小時內的日誌數量，可依 action 篩選。"""
+        return self.counter_24h.count(datetime.now().timestamp(), action)
+
+def hour_key(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%dT%H')
+
+class LogRollups:
+    """
+    已壓縮日誌的每小時彙總，直接操作 DataManager 的 'log_rollups' 區段：
+    {'until': 已彙總到的 timestamp, 'hours': {'YYYY-MM-DDTHH': {action: {status: 數量}}}}
+    早於 until 的原始日誌都已併入彙總，載入時即使仍在日誌檔中也應略過。
+    """
+
+    def __init__(self, section: dict):
+        self.section = section
+        section.setdefault('until', 0.0)
+        section.setdefault('hours', {})
+
+    @property
+    def until(self) -> float:
+        return self.section['until']
+
+    def add(self, timestamp: float, entry: dict):
+        by_action = self.section['hours'].setdefault(hour_key(timestamp), {})
+        by_status = by_action.setdefault(entry.get('action') or 'unknown', {})
+        status = entry.get('status') or 'unknown'
+        by_status[status] = by_status.get(status, 0) + 1
+
+    def fold(self, removed: list, until: float):
+        """把 drop_before() 移除的日誌併入彙總，並推進 until。"""
+        for timestamp, entry in removed:
+            self.add(timestamp, entry)
+        self.section['until'] = max(self.section['until'], until)
+
+    def prune(self, before: float) -> int:
+        """刪除早於 before 的小時彙總，返回刪除的小時數。"""
+        cutoff = hour_key(before)
+        expired = [key for key in self.section['hours'] if key < cutoff]
+        for key in expired:
+            del self.section['hours'][key]
+        return len(expired)
+
+    def count(self, since: float, action: str = None, status: str = None) -> int:
+        """since 所在小時 (含) 之後的彙總數量，以小時為單位。"""
+        start = hour_key(since)
+        total = 0
+        for key, by_action in self.section['hours'].items():
+            if key < start:
+                continue
+            for act, by_status in by_action.items():
+                if action is not None and act != action:
+                    continue
+                total += by_status.get(status, 0) if status is not None else sum(by_status.values())
+        return total
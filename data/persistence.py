@@ -0,0 +1,125 @@
+# 檔案：data/persistence.py
+# 職責：延遲寫入 (write-behind)，把短時間內的多次修改合併成一次背景寫檔。
+
+import asyncio
+import logging
+import os
+import tempfile
+import time
+import metrics
+
+def atomic_write_text(path: str, text: str):
+    """先寫入同目錄的暫存檔再改名取代，寫到一半中斷也不會留下殘缺的檔案。"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+class WriteBehindWriter:
+    """
+    延遲寫入器。
+    - mark_dirty()：標記有資料需要寫入，並喚醒背景任務。
+    - 背景任務等待 delay 秒以合併連續的修改，再於執行緒中呼叫 write()，不阻塞事件迴圈。
+    - flush()：立即寫入所有待寫資料，用於關閉程式前。
+    snapshot() 在事件迴圈中執行，負責取得一致的資料快照；write(snapshot) 在背景執行緒中執行；
+    寫入失敗時會呼叫 restore(snapshot) 讓資料在下次重試時一併寫入。
+    尚未呼叫 start() 時 (例如在同步腳本中使用)，mark_dirty() 會直接同步寫入。
+    """
+
+    def __init__(self, snapshot, write, restore=None, delay: float = 1.0, name: str = "data"):
+        self.snapshot = snapshot
+        self.write = write
+        self.restore = restore
+        self.delay = delay
+        self.name = name
+        self.dirty = False
+        self._wakeup = None
+        self._task = None
+        self._flush_lock = None
+
+    def start(self):
+        """在事件迴圈中啟動背景寫入任務。"""
+        if self._task is not None:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        if self.dirty:
+            self._wakeup.set()
+
+    def mark_dirty(self):
+        self.dirty = True
+        if self._task is not None:
+            self._wakeup.set()
+        else:
+            self.flush_sync()
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # 等待一小段時間，把這段期間的所有修改合併成一次寫入
+            await asyncio.sleep(self.delay)
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """把目前所有待寫資料寫入磁碟 (在背景執行緒中進行)。"""
+        if self._flush_lock is None:
+            self.flush_sync()
+            return
+        async with self._flush_lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            snapshot = self.snapshot()
+            started = time.perf_counter()
+            try:
+                await asyncio.to_thread(self.write, snapshot)
+                metrics.inc('data_saves_total', store=self.name, result='ok')
+            except Exception as e:
+                logging.error(f"背景寫入 {self.name} 失敗，將於下次重試: {e}")
+                metrics.inc('data_saves_total', store=self.name, result='error')
+                self._requeue(snapshot)
+            metrics.observe('data_save_seconds', time.perf_counter() - started, store=self.name)
+
+    def flush_sync(self):
+        """同步寫入，只在背景任務未啟動時使用。"""
+        if not self.dirty:
+            return
+        self.dirty = False
+        snapshot = self.snapshot()
+        try:
+            self.write(snapshot)
+        except Exception as e:
+            logging.error(f"寫入 {self.name} 失敗: {e}")
+            self._requeue(snapshot)
+
+    def _requeue(self, snapshot):
+        if self.restore is not None:
+            self.restore(snapshot)
+        self.dirty = True
+
+    async def stop(self):
+        """停止背景任務並寫入剩餘資料。"""
+        if self._task is None:
+            self.flush_sync()
+            return
+        # 先等進行中的寫入完成，避免中途取消造成寫入順序錯亂
+        async with self._flush_lock:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        self._task = None
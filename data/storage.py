@@ -0,0 +1,260 @@
+# 檔案：data/storage.py
+# 職責：DataManager 的儲存後端。JsonStorage 使用 data.json + JSONL 日誌檔，
+#       SqliteStorage 使用具索引的 SQLite 資料表；兩者提供相同的介面。
+#
+# 後端介面：
+#   load() -> (data, logs, journal)
+#                              啟動時讀取所有結構化資料、日誌與尚未併入區段的變更日誌 (journal)
+#   write(sections, logs, journal, reset_journal=False)
+#                              在背景執行緒中寫入變更的區段 (已序列化為 JSON 字串)、新日誌與新的 journal 紀錄，
+#                              成功寫入的部分會從參數中移除，留下的部分由呼叫端重新排程；
+#                              reset_journal 表示 sections 已包含所有 journal 紀錄的結果，寫入後清空 journal
+#   prune_logs(before)         在背景執行緒中刪除時間早於 before (timestamp) 的日誌
+#   close()                    釋放資源
+
+import json
+import logging
+import os
+import sqlite3
+from threading import Lock
+from .log_store import parse_log_time
+from .persistence import atomic_write_text
+
+DEFAULT_SECTIONS = ('schedules', 'drafts', 'broadcast_sets')
+
+def _read_json_file(path: str):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except json.JSONDecodeError:
+        logging.warning(f"無法解析 {path}，將視為空白資料。")
+        return None
+
+def _read_jsonl_file(path: str) -> list:
+    entries = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # 程式在寫入途中中斷時，最後一行可能不完整，略過即可
+                    logging.warning(f"略過 {path} 中無法解析的日誌行。")
+    except FileNotFoundError:
+        pass
+    return entries
+
+def default_log_path(db_path: str) -> str:
+    return os.path.splitext(db_path)[0] + '_logs.jsonl'
+
+def default_journal_path(db_path: str) -> str:
+    return os.path.splitext(db_path)[0] + '_journal.jsonl'
+
+class JsonStorage:
+    """
+    結構化資料存於精簡的 data.json，日誌逐行附加到 JSONL 日誌檔。
+    頻繁的小變更 (例如推播工作每個目標的狀態) 逐行附加到 journal 檔，不必每次重寫 data.json。
+    """
+
+    def __init__(self, db_path: str = 'data.json', log_path: str = None):
+        self.db_path = db_path
+        self.log_path = log_path or default_log_path(db_path)
+        self.journal_path = default_journal_path(db_path)
+        self.lock = Lock()
+        self.section_texts = {}  # 區段名稱 -> 最近一次序列化的 JSON 字串
+
+    def load(self) -> tuple:
+        data = _read_json_file(self.db_path)
+        if data is None:
+            logging.warning(f"無法讀取 {self.db_path}，將建立新的資料檔案。")
+            data = {}
+        for key in DEFAULT_SECTIONS:
+            data.setdefault(key, [])
+        legacy_logs = data.pop('logs', None)
+        self.section_texts = {key: json.dumps(value, ensure_ascii=False, separators=(',', ':')) for key, value in data.items()}
+        if legacy_logs is not None:
+            # 舊版把日誌直接存在 data.json 的 'logs' 欄位，首次啟動時搬移到日誌檔
+            self._migrate_legacy_logs(legacy_logs)
+            self._write_header()
+            logging.info(f"已將 {len(legacy_logs)} 筆舊日誌從 {self.db_path} 搬移到 {self.log_path}。")
+        return data, _read_jsonl_file(self.log_path), _read_jsonl_file(self.journal_path)
+
+    def _migrate_legacy_logs(self, legacy_logs: list):
+        """
+        以原子寫入產生包含舊日誌的完整日誌檔，之後才從 data.json 移除 'logs'。
+        若上次搬移後、改寫 data.json 前中斷，日誌檔已有的紀錄不會再加入一次。
+        """
+        existing = _read_jsonl_file(self.log_path)
+        seen = {json.dumps(entry, ensure_ascii=False, sort_keys=True) for entry in existing}
+        missing = [entry for entry in legacy_logs if json.dumps(entry, ensure_ascii=False, sort_keys=True) not in seen]
+        if missing:
+            atomic_write_text(self.log_path, ''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in missing + existing))
+
+    def _write_header(self):
+        header = '{' + ','.join(f'{json.dumps(key)}:{text}' for key, text in self.section_texts.items()) + '}'
+        atomic_write_text(self.db_path, header)
+
+    def write(self, sections: dict, logs: list, journal: list, reset_journal: bool = False):
+        with self.lock:
+            if logs:
+                with open(self.log_path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(entry, ensure_ascii=False) + '\n' for entry in logs)
+                # 日誌已寫入，若接下來 data.json 寫入失敗，重試時不應重複附加
+                logs.clear()
+            if journal and not reset_journal:
+                # 只附加不 fsync：程式中斷時已寫入作業系統的內容不會遺失
+                with open(self.journal_path, 'a', encoding='utf-8') as f:
+                    f.writelines(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + '\n' for record in journal)
+                journal.clear()
+            if sections:
+                self.section_texts.update(sections)
+                self._write_header()
+                sections.clear()
+            if reset_journal:
+                # data.json 已包含所有 journal 紀錄的結果；若在此之前中斷，重播舊紀錄也只會得到相同的狀態
+                journal.clear()
+                open(self.journal_path, 'w', encoding='utf-8').close()
+
+    def prune_logs(self, before: float):
+        """重寫日誌檔，只保留 before 之後的日誌 (尚未寫入的日誌之後照常附加)。"""
+        with self.lock:
+            entries = _read_jsonl_file(self.log_path)
+            kept = [e for e in entries if parse_log_time(e) >= before]
+            if len(kept) == len(entries):
+                return
+            atomic_write_text(self.log_path, ''.join(json.dumps(e, ensure_ascii=False) + '\n' for e in kept))
+
+    def close(self):
+        pass
+
+class SqliteStorage:
+    """
+    SQLite 後端：
+    - records：每個清單區段 (如 broadcast_sets) 的一筆資料一列，以 (section, id) 為主鍵。
+    - kv：非清單型的區段，整段以 JSON 存放。
+    - logs：日誌，依時間與 action 建立索引。
+    - journal：尚未併入區段的小變更，依寫入順序重播。
+    每次寫入都在單一交易中完成。
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS records (
+            section TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            body TEXT NOT NULL,
+            PRIMARY KEY (section, id)
+        );
+        CREATE TABLE IF NOT EXISTS kv (
+            key TEXT PRIMARY KEY,
+            body TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS logs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts REAL NOT NULL,
+            action TEXT,
+            status TEXT,
+            user TEXT,
+            body TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS journal (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            body TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_logs_ts ON logs (ts);
+        CREATE INDEX IF NOT EXISTS idx_logs_action_ts ON logs (action, ts);
+    """
+
+    def __init__(self, sqlite_path: str = 'data.sqlite3', import_from: str = None):
+        self.sqlite_path = sqlite_path
+        self.import_from = import_from
+        self.lock = Lock()
+        self.conn = sqlite3.connect(sqlite_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def _is_empty(self) -> bool:
+        with self.lock:
+            for table in ('records', 'kv', 'logs', 'journal'):
+                if self.conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone():
+                    return False
+        return True
+
+    def load(self) -> tuple:
+        if self.import_from and self._is_empty() and os.path.exists(self.import_from):
+            self.import_json(self.import_from)
+
+        data = {key: [] for key in DEFAULT_SECTIONS}
+        with self.lock:
+            for section, body in self.conn.execute("SELECT section, body FROM records ORDER BY section, id"):
+                data.setdefault(section, []).append(json.loads(body))
+            for key, body in self.conn.execute("SELECT key, body FROM kv"):
+                data[key] = json.loads(body)
+            # 已併入每小時彙總的日誌不需載入
+            until = (data.get('log_rollups') or {}).get('until', 0.0)
+            logs = [json.loads(body) for (body,) in self.conn.execute("SELECT body FROM logs WHERE ts >= ? ORDER BY ts, id", (until,))]
+            journal = [json.loads(body) for (body,) in self.conn.execute("SELECT body FROM journal ORDER BY id")]
+        return data, logs, journal
+
+    def import_json(self, json_path: str, log_path: str = None):
+        """一次性從 data.json (及其 JSONL 日誌檔) 匯入所有資料。"""
+        data = _read_json_file(json_path) or {}
+        logs = data.pop('logs', None) or []
+        logs += _read_jsonl_file(log_path or default_log_path(json_path))
+        sections = {key: json.dumps(value, ensure_ascii=False) for key, value in data.items()}
+        journal = _read_jsonl_file(default_journal_path(json_path))
+        section_count, log_count = len(sections), len(logs)
+        self.write(sections, logs, journal)
+        logging.info(f"已從 {json_path} 匯入 {section_count} 個資料區段與 {log_count} 筆日誌到 {self.sqlite_path}。")
+
+    @staticmethod
+    def _is_record_list(value) -> bool:
+        return isinstance(value, list) and all(isinstance(item, dict) and isinstance(item.get('id'), int) for item in value)
+
+    def write(self, sections: dict, logs: list, journal: list, reset_journal: bool = False):
+        with self.lock, self.conn:
+            for key, text in sections.items():
+                value = json.loads(text)
+                self.conn.execute("DELETE FROM records WHERE section = ?", (key,))
+                self.conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+                if self._is_record_list(value):
+                    self.conn.executemany(
+                        "INSERT INTO records (section, id, body) VALUES (?, ?, ?)",
+                        [(key, item['id'], json.dumps(item, ensure_ascii=False)) for item in value]
+                    )
+                else:
+                    self.conn.execute("INSERT INTO kv (key, body) VALUES (?, ?)", (key, text))
+            self.conn.executemany(
+                "INSERT INTO logs (ts, action, status, user, body) VALUES (?, ?, ?, ?, ?)",
+                [(parse_log_time(e), e.get('action'), e.get('status'), e.get('user'), json.dumps(e, ensure_ascii=False)) for e in logs]
+            )
+            if reset_journal:
+                self.conn.execute("DELETE FROM journal")
+            else:
+                self.conn.executemany("INSERT INTO journal (body) VALUES (?)",
+                                      [(json.dumps(record, ensure_ascii=False, separators=(',', ':')),) for record in journal])
+        # 交易成功後才清空，失敗時 DataManager 會把同一批資料重新排入下次寫入
+        sections.clear()
+        logs.clear()
+        journal.clear()
+
+    def prune_logs(self, before: float):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM logs WHERE ts < ?", (before,))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def create_storage(backend: str, db_path: str = 'data.json', sqlite_path: str = 'data.sqlite3'):
+    """依設定建立儲存後端。使用 sqlite 且資料庫為空時，會自動從 db_path 匯入舊資料。"""
+    if backend == 'sqlite':
+        return SqliteStorage(sqlite_path, import_from=db_path)
+    if backend == 'json':
+        return JsonStorage(db_path)
+    raise ValueError(f"不支援的儲存後端: {backend}")
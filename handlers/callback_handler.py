@@ -2,22 +2,31 @@
 # 職責：控制器(Controller)，處理所有按鈕點擊事件。
 
 import logging
+from datetime import datetime, timedelta
 from pyrogram import Client, filters
 from pyrogram.handlers import CallbackQueryHandler as PyrogramCallbackQueryHandler
 from pyrogram.enums import ParseMode
 from pyrogram.types import CallbackQuery
 from pyrogram.errors import MessageNotModified
 import config
+import metrics
 from .states import UserState
+from . import set_editor
 from data.data_manager import DataManager
 import services.info_service as info_service
+import services.broadcast_service as broadcast_service
+import services.health_monitor as health_monitor
+from services.schedule_service import ScheduleService
 import ui.panels as panels
+import ui.render_cache as render_cache
 
 class CallbackHandler:
-    def __init__(self, client: Client, user_states: dict, data_manager: DataManager):
+    def __init__(self, client: Client, user_states: dict, data_manager: DataManager, schedule_service: ScheduleService = None, message_handler=None):
         self.client = client
         self.user_states = user_states
         self.data_manager = data_manager
+        self.schedule_service = schedule_service
+        self.message_handler = message_handler  # 草稿推播沿用 MessageHandler 的背景推播流程
         client.add_handler(
             PyrogramCallbackQueryHandler(
                 self.handle_callback,
@@ -25,6 +34,7 @@ class CallbackHandler:
             )
         )
 
+    @metrics.timed('handler_latency_seconds', handler='callback')
     async def handle_callback(self, client: Client, query: CallbackQuery):
         user_id = query.from_user.id
         data = query.data
@@ -44,6 +54,12 @@ class CallbackHandler:
                 await self.handle_set_management(query, parts)
             elif action == "scan":
                  await self.handle_scan_flow(query, parts)
+            elif action == "schedule":
+                await self.handle_schedule_flow(query, parts)
+            elif action == "logs":
+                await self.handle_log_browser(query, parts)
+            elif action == "drafts":
+                await self.handle_draft_flow(query, parts)
         except Exception as e:
             logging.error(f"處理回調時發生錯誤 ({data}): {e}", exc_info=True)
             await query.answer(f"處理時發生錯誤: {type(e).__name__}", show_alert=True)
@@ -52,25 +68,72 @@ class CallbackHandler:
             await query.answer()
         except Exception: pass
 
+    def _set_management_panel(self) -> dict:
+        sets = self.data_manager.get_broadcast_sets()
+        return render_cache.cached('manage_sets', self.data_manager.get_version('broadcast_sets'), panels.create_broadcast_set_management_panel, sets)
+
     async def handle_back_navigation(self, query: CallbackQuery, target: str):
         if target == "main":
             stats = await info_service.get_system_stats(self.data_manager)
-            await query.message.edit_text(**panels.create_main_panel(stats))
+            await render_cache.edit_panel(query.message, **render_cache.cached('main', tuple(sorted(stats.items())), panels.create_main_panel, stats))
         elif target == "groups":
-            await query.message.edit_text(**panels.create_group_management_panel())
+            await render_cache.edit_panel(query.message, **render_cache.cached('groups', None, panels.create_group_management_panel))
         elif target == "manage_sets":
-            sets = self.data_manager.get_broadcast_sets()
-            await query.message.edit_text(**panels.create_broadcast_set_management_panel(sets))
+            await render_cache.edit_panel(query.message, **self._set_management_panel())
 
     async def handle_main_menu(self, query: CallbackQuery, command: str):
         if command == "broadcast":
             sets = self.data_manager.get_broadcast_sets()
-            await query.message.edit_text(**panels.create_broadcast_target_panel(sets))
+            await render_cache.edit_panel(query.message, **render_cache.cached('broadcast_target', self.data_manager.get_version('broadcast_sets'), panels.create_broadcast_target_panel, sets))
         elif command == "groups":
-            await query.message.edit_text(**panels.create_group_management_panel())
+            await render_cache.edit_panel(query.message, **render_cache.cached('groups', None, panels.create_group_management_panel))
+        elif command == "logs_all":
+            await self.handle_log_browser(query, ["logs", "reset"])
+        elif command == "schedule" and self.schedule_service:
+            self.user_states[query.from_user.id] = {'state': UserState.IDLE}
+            await render_cache.edit_panel(query.message, **panels.create_schedule_management_panel(self.schedule_service.get_schedule_views()))
+        elif command == "drafts":
+            self.user_states[query.from_user.id] = {'state': UserState.IDLE}
+            await render_cache.edit_panel(query.message, **self._draft_management_panel())
         else:
             await query.answer(f"功能「{command}」尚未開放。", show_alert=True)
 
+    def _log_browser_panel(self, filters: dict, page: int) -> dict:
+        hours = panels.LOG_RANGES[filters.get('range', 'all')][1]
+        since = datetime.now() - timedelta(hours=hours) if hours else None
+        logs, total = self.data_manager.query_logs(
+            action=filters.get('action'), status=filters.get('status'), user=filters.get('user'),
+            since=since, offset=page * panels.LOG_PAGE_SIZE, limit=panels.LOG_PAGE_SIZE
+        )
+        return panels.create_log_browser_panel(logs, total, page, filters)
+
+    async def handle_log_browser(self, query: CallbackQuery, parts: list):
+        """推播記錄瀏覽器：篩選條件保存在使用者狀態中，每頁由 DataManager 的日誌索引直接取得。"""
+        user_id = query.from_user.id
+        state = self.user_states.get(user_id) or {'state': UserState.IDLE}
+        self.user_states[user_id] = state
+        command = parts[1]
+        if command == "reset" or 'log_filters' not in state:
+            state['log_filters'] = {'range': '7d'}
+        filters = state['log_filters']
+        page = 0
+
+        if command == "page":
+            page = max(int(parts[2]), 0)
+        elif command == "range" and parts[2] in panels.LOG_RANGES:
+            filters['range'] = parts[2]
+        elif command == "pick" and parts[2] in panels.LOG_FILTER_FIELDS:
+            # 按鈕以索引表示選項，保存顯示時的選項列表，之後新增的日誌不會讓索引對應到其他值
+            values = self.data_manager.get_log_values(parts[2])[:panels.LOG_FILTER_MAX_VALUES]
+            state['log_filter_values'] = {parts[2]: values}
+            return await render_cache.edit_panel(query.message, **panels.create_log_filter_panel(parts[2], values))
+        elif command == "set" and parts[2] in panels.LOG_FILTER_FIELDS:
+            values = state.get('log_filter_values', {}).get(parts[2], [])
+            index = int(parts[3]) if parts[3].isdigit() else None
+            filters[parts[2]] = values[index] if index is not None and index < len(values) else None
+
+        await render_cache.edit_panel(query.message, **self._log_browser_panel(filters, page))
+
     async def handle_broadcast_flow(self, query: CallbackQuery, parts: list):
         user_id = query.from_user.id
         target_type = parts[1]
@@ -78,54 +141,142 @@ class CallbackHandler:
         
         if target_type == 'target' and parts[2] == 'all':
             state.update({'target_type': 'all'})
-            await query.message.edit_text("✅ **目標：所有群組**\n\n請直接發送或回覆您要推播的訊息。", parse_mode=ParseMode.MARKDOWN)
+            await render_cache.edit_panel(query.message, "✅ **目標：所有群組**\n\n請直接發送或回覆您要推播的訊息。", parse_mode=ParseMode.MARKDOWN)
         elif target_type == 'target_set':
             set_id = int(parts[2])
             state.update({'target_type': 'set', 'target_id': set_id})
             set_info = self.data_manager.get_broadcast_set_by_id(set_id)
             if set_info:
-                await query.message.edit_text(f"✅ **目標：組合「{set_info['name']}」**\n\n請直接發送或回覆您要推播的訊息。", parse_mode=ParseMode.MARKDOWN)
+                await render_cache.edit_panel(query.message, f"✅ **目標：組合「{set_info['name']}」**\n\n請直接發送或回覆您要推播的訊息。", parse_mode=ParseMode.MARKDOWN)
             else:
                 await query.answer("❌ 找不到此組合。", show_alert=True)
                 return
         self.user_states[user_id] = state
 
+    async def handle_schedule_flow(self, query: CallbackQuery, parts: list):
+        """處理排程的新增、檢視、啟用/停用與刪除。"""
+        if not self.schedule_service:
+            return await query.answer("排程功能未啟用。", show_alert=True)
+        user_id = query.from_user.id
+        command = parts[1]
+
+        if command == "add":
+            sets = self.data_manager.get_broadcast_sets()
+            await render_cache.edit_panel(query.message, **panels.create_schedule_target_panel(sets))
+        elif command in ["target", "target_set"]:
+            state = {'state': UserState.AWAITING_SCHEDULE_MESSAGE, 'message_id': query.message.message_id}
+            if command == "target":
+                state.update({'target_type': 'all'})
+                target_name = "所有群組"
+            else:
+                set_info = self.data_manager.get_broadcast_set_by_id(int(parts[2]))
+                if not set_info:
+                    return await query.answer("❌ 找不到此組合。", show_alert=True)
+                state.update({'target_type': 'set', 'target_id': set_info['id']})
+                target_name = f"組合「{set_info['name']}」"
+            self.user_states[user_id] = state
+            await render_cache.edit_panel(query.message, 
+                f"✅ **排程目標：{target_name}**\n\n請直接發送或回覆要排程推播的訊息。\n⚠️ 排程執行時會從原訊息複製，請勿刪除該訊息。",
+                parse_mode=ParseMode.MARKDOWN
+            )
+        elif command == "view":
+            view = self.schedule_service.get_schedule_view(int(parts[2]))
+            if not view:
+                return await query.answer("❌ 找不到此排程。", show_alert=True)
+            await render_cache.edit_panel(query.message, **panels.create_schedule_detail_panel(view))
+        elif command == "toggle":
+            schedule_id = int(parts[2])
+            schedule = self.data_manager.get_schedule_by_id(schedule_id)
+            if not schedule:
+                return await query.answer("❌ 找不到此排程。", show_alert=True)
+            self.schedule_service.set_enabled(schedule_id, not schedule.get('enabled', True))
+            self.data_manager.add_log('schedule', 'INFO', f"切換排程 #{schedule_id} 狀態", query.from_user.first_name)
+            await render_cache.edit_panel(query.message, **panels.create_schedule_detail_panel(self.schedule_service.get_schedule_view(schedule_id)))
+        elif command == "delete":
+            schedule_id = int(parts[2])
+            self.schedule_service.delete_schedule(schedule_id)
+            self.data_manager.add_log('schedule', 'INFO', f"刪除排程 #{schedule_id}", query.from_user.first_name)
+            await render_cache.edit_panel(query.message, **panels.create_schedule_management_panel(self.schedule_service.get_schedule_views()))
+            await query.answer("🗑️ 排程已刪除！", show_alert=True)
+
+    def _draft_management_panel(self) -> dict:
+        drafts = self.data_manager.get_drafts()
+        return render_cache.cached('drafts', self.data_manager.get_version('drafts'), panels.create_draft_management_panel, drafts)
+
+    async def handle_draft_flow(self, query: CallbackQuery, parts: list):
+        """處理草稿的新增、檢視、刪除與推播。草稿只是來源訊息的參照，推播時直接建立推播工作。"""
+        user_id = query.from_user.id
+        command = parts[1]
+        draft = self.data_manager.get_draft_by_id(int(parts[2])) if len(parts) > 2 else None
+
+        if command == "add":
+            self.user_states[user_id] = {'state': UserState.AWAITING_DRAFT_MESSAGE, 'message_id': query.message.message_id}
+            await render_cache.edit_panel(query.message, "📝 請直接發送或回覆要存為草稿的訊息：(可隨時用 .cancel 取消)")
+        elif command in ["view", "delete", "send"] and not draft:
+            await query.answer("❌ 找不到此草稿。", show_alert=True)
+        elif command == "view":
+            sets = self.data_manager.get_broadcast_sets()
+            await render_cache.edit_panel(query.message, **panels.create_draft_detail_panel(draft, sets))
+        elif command == "delete":
+            self.data_manager.delete_draft(draft['id'])
+            self.data_manager.add_log('draft', 'INFO', f"刪除草稿 #{draft['id']}", query.from_user.first_name)
+            await render_cache.edit_panel(query.message, **self._draft_management_panel())
+            await query.answer("🗑️ 草稿已刪除！", show_alert=True)
+        elif command == "send":
+            if not self.message_handler:
+                return await query.answer("推播功能未啟用。", show_alert=True)
+            target_id = int(parts[4]) if parts[3] == "set" else None
+            target_channels, target_name = broadcast_service.resolve_targets(self.data_manager, parts[3], target_id)
+            if not target_channels:
+                return await query.answer("❌ 找不到推播目標。", show_alert=True)
+            source = await self.client.get_messages(draft['source_chat_id'], draft['source_message_id'])
+            if not source or source.empty:
+                return await query.answer("❌ 草稿的來源訊息已不存在，請刪除此草稿。", show_alert=True)
+
+            user_name = query.from_user.first_name
+            status_msg = await query.message.reply_text(f"🚀 **開始推播草稿 #{draft['id']}...**\n目標: {target_name} ({len(target_channels)}個)")
+            job_service = self.message_handler.job_service
+            job = job_service.create_job(source, target_channels, target_name, user_name)
+            self.message_handler.start_broadcast(job, source, status_msg, user_id, user_name)
+
     async def handle_group_management(self, query: CallbackQuery, command: str):
         if command == "manage_sets":
-            sets = self.data_manager.get_broadcast_sets()
-            await query.message.edit_text(**panels.create_broadcast_set_management_panel(sets))
+            await render_cache.edit_panel(query.message, **self._set_management_panel())
         elif command == "test_all":
-            await query.answer("正在測試所有目標群組連線...", show_alert=False)
-            all_channels = await info_service.get_all_channel_details(self.client, config.TARGET_CHANNELS_STR)
-            results = [f"• {ch['title']}: {ch['members_count']} 人" for ch in all_channels]
-            text = f"👥 **群組連線測試結果 ({len(all_channels)}個):**\n\n" + "\n".join(results)
-            await query.message.reply_text(text, parse_mode=ParseMode.MARKDOWN)
-        elif command == "scan_all":
-            await query.message.edit_text("📡 正在掃描您帳號中的所有群組與頻道，請稍候...")
-            dialogs = await info_service.scan_all_dialogs(self.client)
+            # 直接顯示背景健康檢查 (每 TARGET_REFRESH_INTERVAL 秒) 保存的結果，不需逐一呼叫 API
+            health = self.data_manager.get_channel_health()
+            if not health.get('targets'):
+                return await query.answer("首次群組健康檢查尚未完成，請稍後再試。", show_alert=True)
+            rows = health_monitor.health_rows(health, config.TARGET_CHANNELS_STR, (datetime.now() - timedelta(days=7)).timestamp())
+            await query.message.reply_text(**panels.create_channel_health_panel(rows, health.get('checked_at')))
+        elif command in ["scan_all", "scan_full"]:
+            # scan_all 只掃描有變化的對話；scan_full 為使用者明確要求的完整重新掃描
+            full = command == "scan_full"
+            await render_cache.edit_panel(query.message, "📡 正在掃描您帳號中的所有群組與頻道，請稍候...")
+            dialogs = await info_service.scan_all_dialogs(self.client, self.data_manager, full=full)
             
             # --- 【新邏輯】將掃描操作寫入日誌 ---
-            log_message = f"掃描完成，找到 {len(dialogs)} 個群組/頻道。"
+            log_message = f"{'完整' if full else '增量'}掃描完成，找到 {len(dialogs)} 個群組/頻道。"
             self.data_manager.add_log(
                 action='scan_groups',
+                status='INFO',
                 message=log_message,
                 user=query.from_user.first_name
             )
-            
-            # 將結果存儲在狀態中以便翻頁
-            self.user_states[query.from_user.id] = {'scanned_dialogs': dialogs}
-            await query.message.edit_text(**panels.create_scan_results_panel(dialogs))
+            await render_cache.edit_panel(query.message, **panels.create_scan_results_panel(dialogs))
     
     async def handle_scan_flow(self, query: CallbackQuery, parts: list):
         """處理群組掃描結果的翻頁。"""
         command = parts[1]
         if command == "page":
             page = int(parts[2])
-            dialogs = self.user_states.get(query.from_user.id, {}).get('scanned_dialogs', [])
+            # 翻頁直接讀取已保存的對話快照，不需把掃描結果複製到每位使用者的狀態中
+            snapshot = self.data_manager.get_dialog_snapshot()
+            dialogs = snapshot['dialogs'] if snapshot else []
             if not dialogs:
                 return await query.answer("掃描結果已過期，請重新掃描。", show_alert=True)
             
-            await query.message.edit_text(**panels.create_scan_results_panel(dialogs, page=page))
+            await render_cache.edit_panel(query.message, **panels.create_scan_results_panel(dialogs, page=page))
 
     async def handle_set_management(self, query: CallbackQuery, parts: list):
         user_id = query.from_user.id
@@ -134,50 +285,62 @@ class CallbackHandler:
 
         if command in ["add", "view"]:
             if command == "add":
-                state = {'state': UserState.AWAITING_SET_NAME, 'set_id': 0, 'message_id': query.message.message_id, 'selected_channels': []}
+                state = {'state': UserState.AWAITING_SET_NAME, 'set_id': 0, 'message_id': query.message.message_id, 'selected_channels': set()}
                 self.user_states[user_id] = state
-                await query.message.edit_text("📝 請輸入新組合的名稱：(可隨時用 .cancel 取消)")
+                await render_cache.edit_panel(query.message, "📝 請輸入新組合的名稱：(可隨時用 .cancel 取消)")
             else: # view
                 b_set = self.data_manager.get_broadcast_set_by_id(set_id)
                 if not b_set: return await query.answer("❌ 找不到此組合。", show_alert=True)
-                self.user_states[user_id] = {'state': UserState.SELECTING_GROUPS_FOR_SET, 'set_id': set_id, 'set_name': b_set['name'], 'message_id': query.message.message_id, 'selected_channels': b_set.get('channels', [])}
-                all_channels = await info_service.get_all_channel_details(self.client, config.TARGET_CHANNELS_STR)
-                await query.message.edit_text(**panels.create_broadcast_set_editor_panel(set_id, b_set['name'], all_channels, b_set.get('channels', [])))
+                state_data = {
+                    'state': UserState.SELECTING_GROUPS_FOR_SET, 'set_id': set_id, 'set_name': b_set['name'],
+                    'message_id': query.message.message_id, 'page': 0, 'search': None,
+                    'selected_channels': {set_editor.to_selection_id(c) for c in b_set.get('channels', [])}
+                }
+                self.user_states[user_id] = state_data
+                await render_cache.edit_panel(query.message, **await set_editor.build_editor_panel(self.client, state_data))
         
-        elif command in ["edit_toggle", "edit_all", "edit_none"]:
+        elif command in ["edit_toggle", "edit_all", "edit_none", "edit_page", "edit_search", "edit_search_clear"]:
             state_data = self.user_states.get(user_id)
             if not (state_data and state_data.get('state') == UserState.SELECTING_GROUPS_FOR_SET): return
-            
+
+            selected = state_data['selected_channels']
             if command == "edit_toggle":
-                channel_id = int(parts[3])
-                if channel_id in state_data['selected_channels']: state_data['selected_channels'].remove(channel_id)
-                else: state_data['selected_channels'].append(channel_id)
+                channel_id = set_editor.to_selection_id(parts[3])
+                if channel_id in selected: selected.discard(channel_id)
+                else: selected.add(channel_id)
+            elif command == "edit_page":
+                state_data['page'] = int(parts[3])
+            elif command == "edit_search":
+                state_data['state'] = UserState.AWAITING_SET_SEARCH
+                return await render_cache.edit_panel(query.message, "🔍 請輸入要搜尋的群組名稱關鍵字：(可隨時用 .cancel 取消)")
+            elif command == "edit_search_clear":
+                state_data.update({'search': None, 'page': 0})
             else:
-                all_channels_details = await info_service.get_all_channel_details(self.client, config.TARGET_CHANNELS_STR)
-                all_channel_ids = [int(c['id']) for c in all_channels_details if isinstance(c['id'], int) or (isinstance(c['id'], str) and c['id'].lstrip('-').isdigit())]
-                state_data['selected_channels'] = all_channel_ids if command == "edit_all" else []
+                # 全選/清空只作用於目前搜尋結果中的群組，群組資訊來自共用快取
+                targets = await set_editor.filtered_targets(self.client, state_data)
+                details = await info_service.get_all_channel_details(self.client, targets)
+                ids = {set_editor.to_selection_id(c['id']) for c in details if str(c['id']).lstrip('-').isdigit()}
+                if command == "edit_all": selected |= ids
+                else: selected -= ids
 
-            all_channels = await info_service.get_all_channel_details(self.client, config.TARGET_CHANNELS_STR)
             try:
-                await query.message.edit_text(**panels.create_broadcast_set_editor_panel(set_id, state_data['set_name'], all_channels, state_data['selected_channels']))
+                await render_cache.edit_panel(query.message, **await set_editor.build_editor_panel(self.client, state_data))
             except MessageNotModified: pass
 
         elif command == "save":
             state_data = self.user_states.get(user_id)
             if state_data and state_data.get('state') == UserState.SELECTING_GROUPS_FOR_SET:
-                self.data_manager.save_broadcast_set(state_data['set_name'], state_data['selected_channels'], set_id if set_id != 0 else None)
+                self.data_manager.save_broadcast_set(state_data['set_name'], sorted(state_data['selected_channels'], key=str), set_id if set_id != 0 else None)
                 self.user_states[user_id] = {'state': UserState.IDLE}
-                sets = self.data_manager.get_broadcast_sets()
-                await query.message.edit_text(**panels.create_broadcast_set_management_panel(sets))
+                await render_cache.edit_panel(query.message, **self._set_management_panel())
                 await query.answer("💾 組合已儲存！", show_alert=True)
         
         elif command == "delete_confirm":
             b_set = self.data_manager.get_broadcast_set_by_id(set_id)
-            if b_set: await query.message.edit_text(**panels.create_delete_confirmation_panel(set_id, b_set['name']))
+            if b_set: await render_cache.edit_panel(query.message, **panels.create_delete_confirmation_panel(set_id, b_set['name']))
 
         elif command == "delete_execute":
             self.data_manager.delete_broadcast_set(set_id)
             self.user_states[user_id] = {'state': UserState.IDLE}
-            sets = self.data_manager.get_broadcast_sets()
-            await query.message.edit_text(**panels.create_broadcast_set_management_panel(sets))
+            await render_cache.edit_panel(query.message, **self._set_management_panel())
             await query.answer("🗑️ 組合已刪除！", show_alert=True)
@@ -1,23 +1,41 @@
 # 檔案：handlers/message_handler.py
 # 職責：控制器(Controller)，處理所有文字訊息和指令，增加詳細日誌並修正按鍵顯示問題。
 
+import asyncio
 import logging
+from datetime import datetime
 from pyrogram import Client, filters
 from pyrogram.handlers import MessageHandler as PyrogramMessageHandler
 from pyrogram.enums import ParseMode
 from pyrogram.types import Message
 import config
+import metrics
 from .states import UserState
+from . import set_editor
 from data.data_manager import DataManager
 import services.info_service as info_service
 import services.broadcast_service as broadcast_service
+from services.schedule_service import ScheduleService, parse_schedule_spec, SCHEDULE_SPEC_HELP
+from services.job_service import BroadcastJobService
 import ui.panels as panels
+import ui.render_cache as render_cache
+from ui.progress import ThrottledProgress
+
+def message_preview(message: Message, limit: int = 50) -> str:
+    """訊息的簡短預覽，用於日誌與草稿列表。"""
+    text = message.text or message.caption
+    if not text:
+        return f"媒體訊息 ({message.media})"
+    return text[:limit] + '...' if len(text) > limit else str(text)
 
 class MessageHandler:
-    def __init__(self, client: Client, user_states: dict, data_manager: DataManager):
+    def __init__(self, client: Client, user_states: dict, data_manager: DataManager, schedule_service: ScheduleService = None, job_service: BroadcastJobService = None):
         self.client = client
         self.user_states = user_states
         self.data_manager = data_manager
+        self.schedule_service = schedule_service
+        self.job_service = job_service or BroadcastJobService(client, data_manager)
+        self.background_tasks = set()  # 保留背景推播的參考，避免被回收
         
         # 正式、安全的過濾器，只監聽來自控制群組和管理員的訊息
         client.add_handler(
@@ -28,6 +46,7 @@ class MessageHandler:
         )
         logging.info("MessageHandler 已啟動，正在指定的控制群組中監聽管理員指令。")
 
+    @metrics.timed('handler_latency_seconds', handler='message')
     async def handle_message(self, client: Client, message: Message):
         """主訊息處理邏輯中心"""
         user_id = message.from_user.id
@@ -44,6 +63,14 @@ class MessageHandler:
                 await self.process_broadcast_message(user_id, message)
             elif current_state == UserState.AWAITING_SET_NAME:
                 await self.process_set_name(user_id, message)
+            elif current_state == UserState.AWAITING_SET_SEARCH:
+                await self.process_set_search(user_id, message)
+            elif current_state == UserState.AWAITING_SCHEDULE_MESSAGE:
+                await self.process_schedule_message(user_id, message)
+            elif current_state == UserState.AWAITING_SCHEDULE_TIME:
+                await self.process_schedule_time(user_id, message)
+            elif current_state == UserState.AWAITING_DRAFT_MESSAGE:
+                await self.process_draft_message(user_id, message)
         
     async def handle_command(self, command: str, message: Message) -> bool:
         """處理文字指令，如果成功處理則返回 True"""
@@ -55,16 +82,17 @@ class MessageHandler:
             
             logging.info("偵錯：正在為 .start 指令生成主面板...")
             stats = await info_service.get_system_stats(self.data_manager)
-            panel_data = panels.create_main_panel(stats)
+            panel_data = render_cache.cached('main', tuple(sorted(stats.items())), panels.create_main_panel, stats)
             
             try:
                 # --- 【最終修正】移除 reply_to_message_id，改為直接發送新訊息 ---
-                await self.client.send_message(
+                sent = await self.client.send_message(
                     chat_id=message.chat.id,
                     text=panel_data['text'],
                     reply_markup=panel_data['reply_markup'],
                     parse_mode=panel_data.get('parse_mode')
                 )
+                render_cache.remember_sent(sent, **panel_data)
                 logging.info("偵錯：已使用 client.send_message (非回覆模式) 成功發送主面板。")
                 self.data_manager.add_log('command', 'SUCCESS', f"執行指令: .{command}", user_name)
             except Exception as e:
@@ -74,11 +102,26 @@ class MessageHandler:
             return True
 
         elif command == "cancel":
+            # .cancel 停止自己啟動的推播；.cancel <工作編號> 停止指定的推播工作 (包括排程推播)
+            args = message.text.split()[1:]
+            job_id = int(args[0].lstrip('#')) if args and args[0].lstrip('#').isdigit() else None
+            cancelled_jobs = self.job_service.cancel_jobs(owner=user_id, job_id=job_id)
+            replies = []
             if self.user_states.get(user_id, {}).get('state') != UserState.IDLE:
                 self.user_states[user_id] = {'state': UserState.IDLE}
-                await message.reply_text("✅ 操作已取消。")
+                replies.append("✅ 操作已取消。")
+            if cancelled_jobs:
+                replies.append(f"⛔ 正在停止推播工作 {', '.join(f'#{j}' for j in cancelled_jobs)}。")
+            elif job_id is not None:
+                replies.append(f"❌ 找不到執行中的推播工作 #{job_id}。")
+            if replies:
+                await message.reply_text("\n".join(replies))
                 self.data_manager.add_log('command', 'SUCCESS', f"執行指令: .{command}", user_name)
             return True
+        elif command == "metrics":
+            await message.reply_text(metrics.render_summary()[:4096], parse_mode=ParseMode.MARKDOWN)
+            self.data_manager.add_log('command', 'SUCCESS', f"執行指令: .{command}", user_name)
+            return True
         elif command == "id":
             text = f"👤 **您的 User ID:** `{user_id}`\n💬 **此群組 Chat ID:** `{message.chat.id}`"
             if message.reply_to_message:
@@ -94,16 +137,9 @@ class MessageHandler:
     async def process_broadcast_message(self, user_id: int, message: Message):
         state_data = self.user_states.get(user_id, {})
         user_name = message.from_user.first_name
-        target_type = state_data.get('target_type')
-        target_channels, target_name = [], ""
-
-        if target_type == 'all':
-            target_channels, target_name = config.TARGET_CHANNELS_STR, "所有群組"
-        elif target_type == 'set':
-            set_id = state_data.get('target_id')
-            b_set = self.data_manager.get_broadcast_set_by_id(set_id)
-            if b_set:
-                target_channels, target_name = b_set['channels'], f"組合「{b_set['name']}」"
+        target_channels, target_name = broadcast_service.resolve_targets(
+            self.data_manager, state_data.get('target_type'), state_data.get('target_id')
+        )
 
         if not target_channels:
             err_msg = "錯誤：找不到推播目標。"
@@ -112,22 +148,139 @@ class MessageHandler:
         else:
             status_msg = await message.reply_text(f"🚀 **開始推播...**\n目標: {target_name} ({len(target_channels)}個)")
             msg_to_bcast = message.reply_to_message or message
-            success, failed = await broadcast_service.broadcast_to_targets(self.client, target_channels, msg_to_bcast)
-            result_text = f"✅ **推播完成！**\n\n- **目標**: {target_name}\n- **成功**: {success} 個\n- **失敗**: {failed} 個"
-            await status_msg.edit_text(result_text)
-            
-            log_msg_content = msg_to_bcast.text[:50] + '...' if msg_to_bcast.text and len(msg_to_bcast.text) > 50 else msg_to_bcast.text or f"媒體訊息 ({msg_to_bcast.media})"
-            log_status = 'SUCCESS' if failed == 0 else 'PARTIAL_SUCCESS' if success > 0 else 'FAILURE'
-            log_msg_detail = f"推播到「{target_name}」。結果: 成功 {success}, 失敗 {failed}。內容: {log_msg_content}"
-            self.data_manager.add_log('broadcast', log_status, log_msg_detail, user_name)
+            job = self.job_service.create_job(msg_to_bcast, target_channels, target_name, user_name)
+            self.start_broadcast(job, msg_to_bcast, status_msg, user_id, user_name)
         
         self.user_states[user_id] = {'state': UserState.IDLE}
 
+    def start_broadcast(self, job: dict, msg_to_bcast: Message, status_msg: Message, user_id: int, user_name: str):
+        """在背景執行推播工作 (見 run_broadcast)，控制群組在推播期間仍可正常操作。"""
+        task = asyncio.create_task(self.run_broadcast(job, msg_to_bcast, status_msg, user_id, user_name))
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+
+    async def run_broadcast(self, job: dict, msg_to_bcast: Message, status_msg: Message, user_id: int, user_name: str):
+        """執行推播工作，期間以節流的方式更新進度，結束後顯示結果並寫入日誌。"""
+        target_name, total = job['target_name'], len(job['targets'])
+
+        def render_progress(current_job: dict) -> str:
+            success, failed = self.job_service.count_results(current_job)
+            skipped = self.job_service.count_skipped(current_job)
+            return (f"🚀 **推播中... 工作 #{job['id']}**\n目標: {target_name}\n"
+                    f"進度: {success + failed + skipped} / {total} (成功 {success}, 失敗 {failed}, 略過 {skipped})\n"
+                    f"發送 `{config.COMMAND_PREFIX}cancel` 可停止推播。")
+
+        progress = ThrottledProgress(status_msg, render_progress, config.BROADCAST_PROGRESS_INTERVAL, parse_mode=ParseMode.MARKDOWN)
+        cancelled = False
+        try:
+            success, failed = await self.job_service.start_job(job, msg_to_bcast, owner=user_id, on_progress=progress.update)
+        except asyncio.CancelledError:
+            if job.get('status') == 'running':
+                # 程式結束時中斷，工作維持 running，下次啟動時自動恢復
+                raise
+            cancelled = True
+            success, failed = self.job_service.count_results(job)
+        except Exception as e:
+            # 工作仍為 running，下次啟動時會自動恢復
+            logging.error(f"推播工作 #{job['id']} 執行失敗: {e}", exc_info=True)
+            success, failed = self.job_service.count_results(job)
+        finally:
+            await progress.stop()
+
+        skipped = self.job_service.count_skipped(job)
+        skipped_line = f"\n- **略過 (重複)**: {skipped} 個" if skipped else ""
+        if cancelled:
+            result_text = f"⛔ **推播已取消**\n\n- **目標**: {target_name}\n- **成功**: {success} 個\n- **失敗**: {failed} 個{skipped_line}\n- **未發送**: {total - success - failed - skipped} 個"
+        else:
+            result_text = f"✅ **推播完成！**\n\n- **目標**: {target_name}\n- **成功**: {success} 個\n- **失敗**: {failed} 個{skipped_line}"
+        try:
+            await render_cache.edit_panel(status_msg, result_text)
+        except Exception as e:
+            logging.error(f"顯示推播結果失敗: {e}")
+
+        log_msg_content = message_preview(msg_to_bcast)
+        if cancelled:
+            log_status = 'CANCELLED'
+        else:
+            log_status = 'SUCCESS' if failed == 0 else 'PARTIAL_SUCCESS' if success > 0 else 'FAILURE'
+        log_msg_detail = f"推播到「{target_name}」。結果: 成功 {success}, 失敗 {failed}, 略過 {skipped}。內容: {log_msg_content}"
+        self.data_manager.add_log('broadcast', log_status, log_msg_detail, user_name)
+
     async def process_set_name(self, user_id: int, message: Message):
         state_data = self.user_states.get(user_id, {})
         set_id = state_data.get('set_id', 0)
-        state_data.update({'state': UserState.SELECTING_GROUPS_FOR_SET, 'set_name': message.text})
+        state_data.update({'state': UserState.SELECTING_GROUPS_FOR_SET, 'set_id': set_id, 'set_name': message.text, 'page': 0, 'search': None})
+        state_data.setdefault('selected_channels', set())
         self.data_manager.add_log('manage_set', 'INFO', f"使用者開始為組合命名: {message.text}", message.from_user.first_name)
-        all_channels = await info_service.get_all_channel_details(self.client, config.TARGET_CHANNELS_STR)
-        panel_data = panels.create_broadcast_set_editor_panel(set_id, message.text, all_channels, state_data.get('selected_channels', []))
-        await self.client.edit_message_text(chat_id=config.CONTROL_GROUP, message_id=state_data['message_id'], **panel_data)
+        panel_data = await set_editor.build_editor_panel(self.client, state_data)
+        await render_cache.edit_panel_by_id(self.client, config.CONTROL_GROUP, state_data['message_id'], **panel_data)
+
+    async def process_set_search(self, user_id: int, message: Message):
+        """套用編輯器的搜尋關鍵字，回到第一頁並更新原本的編輯器面板。"""
+        state_data = self.user_states.get(user_id, {})
+        state_data.update({'state': UserState.SELECTING_GROUPS_FOR_SET, 'search': message.text.strip() or None, 'page': 0})
+        panel_data = await set_editor.build_editor_panel(self.client, state_data)
+        await render_cache.edit_panel_by_id(self.client, config.CONTROL_GROUP, state_data['message_id'], **panel_data)
+
+    async def process_draft_message(self, user_id: int, message: Message):
+        """
+        把訊息存為草稿：只記錄來源訊息的位置與內容雜湊，推播時直接從原訊息複製。
+        相同內容 (雜湊相同) 的草稿已存在時不會重複保存。
+        """
+        state_data = self.user_states.get(user_id, {})
+        user_name = message.from_user.first_name
+        source = message.reply_to_message or message
+        content_hash = broadcast_service.content_fingerprint(source)
+        existing = self.data_manager.find_draft_by_hash(content_hash)
+        if existing:
+            await message.reply_text(f"ℹ️ 相同內容的草稿已存在：#{existing['id']}")
+        else:
+            draft_id = self.data_manager.add_draft({
+                'source_chat_id': source.chat.id,
+                'source_message_id': source.id,
+                'content_hash': content_hash,
+                'preview': message_preview(source, 30),
+                'user': user_name,
+                'created_at': datetime.now().isoformat()
+            })
+            self.data_manager.add_log('draft', 'SUCCESS', f"新增草稿 #{draft_id}", user_name)
+            await message.reply_text(f"✅ 已儲存為草稿 #{draft_id}\n⚠️ 推播時會從原訊息複製，請勿刪除該訊息。")
+
+        self.user_states[user_id] = {'state': UserState.IDLE}
+        if state_data.get('message_id'):
+            panel_data = panels.create_draft_management_panel(self.data_manager.get_drafts())
+            await render_cache.edit_panel_by_id(self.client, config.CONTROL_GROUP, state_data['message_id'], **panel_data)
+
+    async def process_schedule_message(self, user_id: int, message: Message):
+        """記錄要排程的訊息位置 (不複製內容)，接著詢問排程時間。"""
+        state_data = self.user_states.get(user_id, {})
+        source = message.reply_to_message or message
+        state_data.update({
+            'state': UserState.AWAITING_SCHEDULE_TIME,
+            'source_chat_id': source.chat.id,
+            'source_message_id': source.id
+        })
+        await message.reply_text(f"🕒 請輸入排程時間，支援以下格式：\n{SCHEDULE_SPEC_HELP}", parse_mode=ParseMode.MARKDOWN)
+
+    async def process_schedule_time(self, user_id: int, message: Message):
+        state_data = self.user_states.get(user_id, {})
+        try:
+            spec = parse_schedule_spec(message.text)
+        except ValueError as e:
+            await message.reply_text(f"❌ {e}\n請重新輸入，支援以下格式：\n{SCHEDULE_SPEC_HELP}", parse_mode=ParseMode.MARKDOWN)
+            return
+
+        user_name = message.from_user.first_name
+        schedule_id = self.schedule_service.add_schedule({
+            **spec,
+            'target_type': state_data.get('target_type'),
+            'target_id': state_data.get('target_id'),
+            'source_chat_id': state_data['source_chat_id'],
+            'source_message_id': state_data['source_message_id'],
+            'created_by': user_name
+        })
+        self.data_manager.add_log('schedule', 'SUCCESS', f"新增排程 #{schedule_id}: {message.text}", user_name)
+        self.user_states[user_id] = {'state': UserState.IDLE}
+        panel_data = panels.create_schedule_management_panel(self.schedule_service.get_schedule_views())
+        await message.reply_text(f"✅ 排程 #{schedule_id} 已建立！")
+        await self.client.send_message(chat_id=message.chat.id, **panel_data)
@@ -0,0 +1,42 @@
+# 檔案：handlers/set_editor.py
+# 職責：推播組合編輯器的共用渲染邏輯 (分頁、搜尋)，供訊息與按鈕處理器使用。
+
+from pyrogram import Client
+import config
+import services.info_service as info_service
+from services.chat_cache import chat_cache
+from services.target_registry import target_registry
+import ui.panels as panels
+import ui.render_cache as render_cache
+
+def to_selection_id(channel_id):
+    """勾選狀態以 int ID 保存 (與儲存的組合相同)；@username 等非數字目標保持原樣。"""
+    return target_registry.chat_id(channel_id)
+
+async def filtered_targets(client: Client, state_data: dict) -> list:
+    """目前搜尋條件下的所有目標。"""
+    return await info_service.search_channels(client, config.TARGET_CHANNELS_STR, state_data.get('search'))
+
+async def build_editor_panel(client: Client, state_data: dict) -> dict:
+    """
+    產生編輯器面板：只查詢 (通常直接命中快取) 目前這一頁的群組資訊。
+    state_data 需包含 set_id、set_name、selected_channels (set)，可選 page 與 search。
+    """
+    targets = await filtered_targets(client, state_data)
+    page_size = panels.SET_EDITOR_PAGE_SIZE
+    total_pages = max((len(targets) - 1) // page_size + 1, 1)
+    page = min(max(state_data.get('page', 0), 0), total_pages - 1)
+    state_data['page'] = page
+    page_channels = await info_service.get_all_channel_details(client, targets[page * page_size:(page + 1) * page_size])
+
+    selected = state_data['selected_channels']
+    # 版本涵蓋面板用到的所有資料：群組資訊快取、勾選狀態、頁碼、搜尋條件與目標數量
+    version = (
+        state_data['set_id'], state_data['set_name'], chat_cache.version, page, state_data.get('search'),
+        len(targets), frozenset(selected)
+    )
+    return render_cache.cached(
+        'set_editor', version, panels.create_broadcast_set_editor_panel,
+        state_data['set_id'], state_data['set_name'], page_channels, selected,
+        len(targets), page=page, total_pages=total_pages, search=state_data.get('search')
+    )
@@ -13,3 +13,11 @@ class UserState(Enum):
     # --- 推播組合管理流程 ---
     AWAITING_SET_NAME = auto()              # 等待使用者輸入組合名稱
     SELECTING_GROUPS_FOR_SET = auto()       # 使用者正在編輯器中選擇群組
+    AWAITING_SET_SEARCH = auto()            # 等待使用者輸入編輯器的搜尋關鍵字
+
+    # --- 排程流程 ---
+    AWAITING_SCHEDULE_MESSAGE = auto()      # 等待使用者發送或回覆要排程推播的訊息
+    AWAITING_SCHEDULE_TIME = auto()         # 等待使用者輸入排程時間
+
+    # --- 草稿流程 ---
+    AWAITING_DRAFT_MESSAGE = auto()         # 等待使用者發送或回覆要存為草稿的訊息
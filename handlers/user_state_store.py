@@ -0,0 +1,116 @@
+# 檔案：handlers/user_state_store.py
+# 職責：使用者操作狀態的存放區。用法與 dict 相同，但項目會過期、數量有上限，
+#       並可選擇延遲寫入磁碟，重新啟動後未完成的操作 (例如編輯中的推播組合) 得以延續。
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from data.persistence import WriteBehindWriter, atomic_write_text
+from .states import UserState
+
+def _encode(value):
+    if isinstance(value, UserState):
+        return {'__state__': value.name}
+    if isinstance(value, (set, frozenset)):
+        return {'__set__': sorted(value, key=str)}
+    raise TypeError(f"無法序列化的使用者狀態欄位: {type(value).__name__}")
+
+def _decode(obj: dict):
+    if '__state__' in obj:
+        return UserState[obj['__state__']]
+    if '__set__' in obj:
+        return set(obj['__set__'])
+    return obj
+
+class UserStateStore(MutableMapping):
+    """
+    以 user_id 為鍵的狀態存放區，依最後存取時間做 LRU 淘汰：
+    - 超過 ttl 秒未存取的項目視為過期 (讀取時與寫入磁碟前清除)。
+    - 超過 max_size 個項目時移除最久未使用者，放棄的操作再多記憶體用量也不會增加。
+    處理器會直接修改 get() 取得的 dict，因此每次存取都會標記需要寫入，實際寫入由延遲寫入器合併。
+    path 為空時只保存在記憶體中。
+    """
+
+    def __init__(self, ttl: float, max_size: int, path: str = None, save_delay: float = 1.0):
+        self.ttl = ttl
+        self.max_size = max(max_size, 1)
+        self.path = path or None
+        self.entries = OrderedDict()  # user_id -> (最後存取時間 (epoch 秒), 狀態 dict)
+        self.writer = WriteBehindWriter(self._snapshot, self._write, delay=save_delay, name="user_states") if self.path else None
+        self._load()
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f, object_hook=_decode)
+        except (OSError, ValueError, KeyError) as e:
+            logging.error(f"讀取使用者狀態檔 {self.path} 失敗，將從空白狀態開始: {e}")
+            return
+        for user_id, (touched_at, state) in sorted(stored.items(), key=lambda item: item[1][0]):
+            self.entries[int(user_id)] = (touched_at, state)
+        self._evict()
+        logging.info(f"已恢復 {len(self.entries)} 位使用者的操作狀態。")
+
+    def _evict(self):
+        """移除過期項目與超出容量的最舊項目；項目依存取時間排序，只需從頭檢查。"""
+        deadline = time.time() - self.ttl
+        while self.entries:
+            touched_at, _ = next(iter(self.entries.values()))
+            if touched_at >= deadline and len(self.entries) <= self.max_size:
+                break
+            self.entries.popitem(last=False)
+
+    def _touch(self, user_id, state: dict):
+        self.entries[user_id] = (time.time(), state)
+        self.entries.move_to_end(user_id)
+        self._evict()
+        if self.writer:
+            self.writer.mark_dirty()
+
+    def __getitem__(self, user_id):
+        self._evict()
+        _, state = self.entries[user_id]
+        self._touch(user_id, state)
+        return state
+
+    def __setitem__(self, user_id, state: dict):
+        self._touch(user_id, state)
+
+    def __delitem__(self, user_id):
+        del self.entries[user_id]
+        if self.writer:
+            self.writer.mark_dirty()
+
+    def __iter__(self):
+        self._evict()
+        return iter(list(self.entries))
+
+    def __len__(self):
+        self._evict()
+        return len(self.entries)
+
+    def _snapshot(self) -> str:
+        self._evict()
+        # 閒置狀態不需保存
+        active = {
+            str(user_id): [touched_at, state] for user_id, (touched_at, state) in self.entries.items()
+            if state.get('state', UserState.IDLE) != UserState.IDLE
+        }
+        return json.dumps(active, ensure_ascii=False, default=_encode)
+
+    def _write(self, text: str):
+        atomic_write_text(self.path, text)
+
+    def start(self):
+        """在事件迴圈中啟動背景寫入。"""
+        if self.writer:
+            self.writer.start()
+
+    async def close(self):
+        if self.writer:
+            await self.writer.stop()
@@ -3,21 +3,141 @@
 
 import asyncio
 import logging
+import time
 from pyrogram import Client
 from pyrogram.enums import ParseMode
 from pyrogram.errors import PeerIdInvalid
 
 import config
+import metrics
 from data.data_manager import DataManager
+from data.storage import create_storage
 from handlers.message_handler import MessageHandler
 from handlers.callback_handler import CallbackHandler
+from handlers.user_state_store import UserStateStore
 import services.info_service as info_service
+import services.broadcast_service as broadcast_service
+from services.account_pool import account_pool
+from services.target_registry import target_registry
+from services.send_ledger import send_ledger
+from services.schedule_service import ScheduleService
+from services.job_service import BroadcastJobService
+from services.health_monitor import ChannelHealthMonitor
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 log = logging.getLogger(__name__)
-user_states = {} 
+user_states = UserStateStore(
+    ttl=config.USER_STATE_TTL,
+    max_size=config.USER_STATE_MAX_SIZE,
+    path=config.USER_STATE_FILE,
+    save_delay=config.DATA_SAVE_DELAY
+)
+
+extra_clients = []  # 已登入的額外推播帳號，結束時需一併停止
+
+class StartupTimer:
+    """記錄每個啟動階段的耗時，並寫入 startup_phase_seconds 指標。"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        log.info(f"啟動階段「{phase}」完成，耗時 {now - self.last:.2f} 秒。")
+        metrics.observe('startup_phase_seconds', now - self.last, phase=phase)
+        self.last = now
+
+    def total(self) -> float:
+        return time.perf_counter() - self.started
+
+async def start_extra_accounts():
+    """登入 EXTRA_SESSIONS 中的額外推播帳號並加入帳號池，登入失敗的帳號會被略過。"""
+    for session_name in config.EXTRA_SESSIONS:
+        extra = Client(session_name, api_id=config.API_ID, api_hash=config.API_HASH)
+        try:
+            await extra.start()
+        except Exception as e:
+            log.error(f"額外帳號 {session_name} 登入失敗，將不會使用: {e}")
+            continue
+        account_pool.add(session_name, extra)
+        extra_clients.append(extra)
+        log.info(f"已加入額外推播帳號: {session_name}")
+    if extra_clients:
+        await account_pool.refresh_membership()
+
+async def startup_report(client: Client, data_manager: DataManager):
+    """背景執行啟動時的群組掃描 (有快照時為增量掃描) 並把報告發送到控制群組。"""
+    started = time.perf_counter()
+    dialogs = await info_service.scan_all_dialogs(client, data_manager)
+    log.info(f"背景掃描耗時 {time.perf_counter() - started:.2f} 秒。")
+
+    log_message = f"啟動時掃描完成，找到 {len(dialogs)} 個群組/頻道。"
+    # [修正] 使用新的日誌格式
+    data_manager.add_log(action='startup_scan', status='INFO', message=log_message, user="System")
+
+    scan_results_text = "📡 **啟動時群組偵測報告**\n\n"
+    if dialogs:
+        report_lines = [f"• **{d['title']}**\n  `{d['id']}` ({d['type']})" for d in dialogs]
+        scan_results_text += "\n".join(report_lines)
+    else:
+        scan_results_text += "未在您的帳號中發現任何超級群組或頻道。"
+
+    if len(scan_results_text) > 4096:
+        scan_results_text = scan_results_text[:4090] + "\n...報告過長，已被截斷"
+
+    try:
+        await client.send_message(
+            config.CONTROL_GROUP,
+            f"✅ **RG 自動推播 Userbot 已成功啟動！**\n請發送 `{config.COMMAND_PREFIX}start` 來顯示主選單。",
+            parse_mode=ParseMode.MARKDOWN
+        )
+        await client.send_message(
+            config.CONTROL_GROUP,
+            scan_results_text,
+            parse_mode=ParseMode.MARKDOWN
+        )
+    except PeerIdInvalid:
+        log.error("="*60)
+        log.error("！！！啟動警告：指定的 CONTROL_GROUP ID 不正確或無法訪問！")
+        log.error(f"目前設定的錯誤 ID: {config.CONTROL_GROUP}")
+        log.error("★ 好消息：已將您所有的群組列表發送到您的「已存訊息 (Saved Messages)」中。")
+        log.error("\n請依照以下步驟修正：")
+        log.error("1. 打開您的 Telegram，找到「已存訊息 (Saved Messages)」。")
+        log.error("2. 從該列表中找到您想設為「控制群組」的群組，並複製其 -100 開頭的 ID。")
+        log.error("3. 將此 ID 更新到您的 .env 檔案的 CONTROL_GROUP 欄位中。")
+        log.error("4. 重啟程式。")
+        log.error("="*60)
+        try:
+            await client.send_message("me", scan_results_text, parse_mode=ParseMode.MARKDOWN)
+            log.info("已成功將群組列表發送到您的「已存訊息」。")
+        except Exception as send_to_me_error:
+            log.error(f"發送群組列表到「已存訊息」時失敗: {send_to_me_error}")
+
+async def compact_logs_periodically(data_manager: DataManager):
+    """定期執行日誌保留與壓縮，讓記憶體用量與啟動載入時間不隨運行時間增加。"""
+    day = 24 * 60 * 60
+    while True:
+        try:
+            await data_manager.compact_logs(
+                config.LOG_RETENTION_DAYS * day, config.LOG_MAX_ENTRIES, config.LOG_ROLLUP_RETENTION_DAYS * day
+            )
+        except Exception as e:
+            log.error(f"日誌壓縮失敗: {e}", exc_info=True)
+        await asyncio.sleep(config.LOG_COMPACT_INTERVAL)
+
+def run_in_background(coro, name: str) -> asyncio.Task:
+    """建立背景任務，失敗時記錄錯誤而不影響主程式。"""
+    task = asyncio.create_task(coro, name=name)
+
+    def report(t: asyncio.Task):
+        if not t.cancelled() and t.exception():
+            log.error(f"背景任務 {name} 失敗: {t.exception()}", exc_info=t.exception())
+    task.add_done_callback(report)
+    return task
 
 async def main():
+    timer = StartupTimer()
     log.info("初始化 Pyrogram 客戶端...")
     async with Client(
         "user_session",
@@ -26,64 +146,65 @@ async def main():
         phone_number=config.PHONE_NUMBER,
         password=config.PASSWORD
     ) as client:
+        me = getattr(client, 'me', None)
+        if me:
+            log.info(f"成功登入帳戶: {me.first_name} (ID: {me.id})")
+        timer.mark("登入")
+
         log.info("初始化資料管理器...")
-        data_manager = DataManager()
+        storage = create_storage(config.STORAGE_BACKEND, sqlite_path=config.SQLITE_PATH)
+        data_manager = DataManager(save_delay=config.DATA_SAVE_DELAY, storage=storage)
+        data_manager.start()
+        user_states.start()
+        account_pool.load_rate_state(data_manager.get_rate_state())
+        send_ledger.load(data_manager.get_send_ledger())
+        account_pool.add("user_session", client, broadcast_service.rate_limiter, primary=True)
+        timer.mark("載入資料")
+
+        job_service = BroadcastJobService(client, data_manager)
+        health = ChannelHealthMonitor(client, data_manager)
+        log.info("啟動排程器...")
+        schedule_service = ScheduleService(client, data_manager, job_service)
+        schedule_service.start()
         log.info("註冊事件處理器...")
-        MessageHandler(client, user_states, data_manager)
-        CallbackHandler(client, user_states, data_manager)
+        message_handler = MessageHandler(client, user_states, data_manager, schedule_service, job_service)
+        CallbackHandler(client, user_states, data_manager, schedule_service, message_handler)
+        timer.mark("排程器與事件處理器")
 
+        background_tasks = []
         try:
-            me = await client.get_me()
-            log.info(f"成功登入帳戶: {me.first_name} (ID: {me.id})")
-            log.info("啟動時掃描群組...")
-            dialogs = await info_service.scan_all_dialogs(client)
-            
-            log_message = f"啟動時掃描完成，找到 {len(dialogs)} 個群組/頻道。"
-            # [修正] 使用新的日誌格式
-            data_manager.add_log(action='startup_scan', status='INFO', message=log_message, user="System")
-            
-            scan_results_text = "📡 **啟動時群組偵測報告**\n\n"
-            if dialogs:
-                report_lines = [f"• **{d['title']}**\n  `{d['id']}` ({d['type']})" for d in dialogs]
-                scan_results_text += "\n".join(report_lines)
-            else:
-                scan_results_text += "未在您的帳號中發現任何超級群組或頻道。"
-
-            if len(scan_results_text) > 4096:
-                scan_results_text = scan_results_text[:4090] + "\n...報告過長，已被截斷"
-
-            try:
-                await client.send_message(
-                    config.CONTROL_GROUP,
-                    f"✅ **RG 自動推播 Userbot 已成功啟動！**\n請發送 `{config.COMMAND_PREFIX}start` 來顯示主選單。",
-                    parse_mode=ParseMode.MARKDOWN
-                )
-                await client.send_message(
-                    config.CONTROL_GROUP,
-                    scan_results_text,
-                    parse_mode=ParseMode.MARKDOWN
-                )
-            except PeerIdInvalid:
-                log.error("="*60)
-                log.error("！！！啟動警告：指定的 CONTROL_GROUP ID 不正確或無法訪問！")
-                log.error(f"目前設定的錯誤 ID: {config.CONTROL_GROUP}")
-                log.error("★ 好消息：已將您所有的群組列表發送到您的「已存訊息 (Saved Messages)」中。")
-                log.error("\n請依照以下步驟修正：")
-                log.error("1. 打開您的 Telegram，找到「已存訊息 (Saved Messages)」。")
-                log.error("2. 從該列表中找到您想設為「控制群組」的群組，並複製其 -100 開頭的 ID。")
-                log.error("3. 將此 ID 更新到您的 .env 檔案的 CONTROL_GROUP 欄位中。")
-                log.error("4. 重啟程式。")
-                log.error("="*60)
-                try:
-                    await client.send_message("me", scan_results_text, parse_mode=ParseMode.MARKDOWN)
-                    log.info("已成功將群組列表發送到您的「已存訊息」。")
-                except Exception as send_to_me_error:
-                    log.error(f"發送群組列表到「已存訊息」時失敗: {send_to_me_error}")
-            
-            log.info("Userbot 已啟動並待命中... (按 Ctrl+C 停止)")
+            # 其餘工作都在背景進行，不延遲可接收指令的時間：
+            # 目標解析與群組資訊、額外帳號登入、啟動掃描與報告、恢復中斷的推播
+            background_tasks = [
+                run_in_background(target_registry.run_refresher(client, config.TARGET_REFRESH_INTERVAL, on_refresh=health.on_refresh), "target_registry"),
+                run_in_background(start_extra_accounts(), "extra_accounts"),
+                run_in_background(startup_report(client, data_manager), "startup_report"),
+                run_in_background(job_service.resume_unfinished(), "resume_jobs"),
+                run_in_background(compact_logs_periodically(data_manager), "log_compaction"),
+            ]
+            if metrics.ENABLED:
+                background_tasks.append(run_in_background(metrics.run_exporter(config.METRICS_FILE, config.METRICS_INTERVAL), "metrics_exporter"))
+            ready_seconds = timer.total()
+            metrics.observe('startup_ready_seconds', ready_seconds)
+            log.info(f"Userbot 已啟動並待命中... (啟動耗時 {ready_seconds:.2f} 秒，按 Ctrl+C 停止)")
             await asyncio.Future()
         except Exception as e:
             log.error(f"運行過程中發生嚴重錯誤: {e}", exc_info=True)
+        finally:
+            schedule_service.shutdown()
+            # 先停止背景任務 (包括恢復推播) 與執行中的推播工作，最後的檢查點才能在關閉儲存後端前寫入
+            for task in background_tasks:
+                task.cancel()
+            await asyncio.gather(*background_tasks, return_exceptions=True)
+            await job_service.stop()
+            for extra in extra_clients:
+                try:
+                    await extra.stop()
+                except Exception as e:
+                    log.error(f"停止額外帳號時發生錯誤: {e}")
+            log.info("正在寫入尚未儲存的資料...")
+            await data_manager.close()
+            await user_states.close()
 
 if __name__ == "__main__":
     try:
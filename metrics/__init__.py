@@ -0,0 +1,134 @@
+# 檔案：metrics/__init__.py
+# 職責：輕量的效能指標 (計數器與延遲直方圖)，可輸出成 Prometheus 文字格式。
+#       METRICS_ENABLED 關閉時，所有記錄函式直接返回，timed() 也不會包裝函式，幾乎沒有額外成本。
+
+import asyncio
+import functools
+import logging
+import time
+import config
+
+ENABLED = config.METRICS_ENABLED
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+class Histogram:
+    """累積型直方圖，與 Prometheus 的 histogram 相同：每個桶記錄 <= 上限的次數。"""
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value: float):
+        self.count += 1
+        self.total += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q: float) -> float:
+        """以桶上限估算分位數，供控制群組的摘要顯示。"""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+# 指標名稱 -> {標籤 tuple: 值}
+counters = {}
+histograms = {}
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+def inc(name: str, value: float = 1, **labels):
+    """計數器加上 value。"""
+    if not ENABLED:
+        return
+    series = counters.setdefault(name, {})
+    key = _labels_key(labels)
+    series[key] = series.get(key, 0) + value
+
+def observe(name: str, seconds: float, **labels):
+    """記錄一次耗時 (秒)。"""
+    if not ENABLED:
+        return
+    series = histograms.setdefault(name, {})
+    key = _labels_key(labels)
+    histogram = series.get(key)
+    if histogram is None:
+        histogram = series[key] = Histogram()
+    histogram.observe(seconds)
+
+def timed(name: str, **labels):
+    """裝飾非同步函式，記錄每次呼叫的耗時；指標關閉時直接返回原函式。"""
+    def decorator(func):
+        if not ENABLED:
+            return func
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - started, **labels)
+        return wrapper
+    return decorator
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in items) + "}"
+
+def render_prometheus() -> str:
+    """輸出 Prometheus 文字格式。"""
+    lines = []
+    for name, series in sorted(counters.items()):
+        lines.append(f"# TYPE {name} counter")
+        for key, value in series.items():
+            lines.append(f"{name}{_format_labels(key)} {value}")
+    for name, series in sorted(histograms.items()):
+        lines.append(f"# TYPE {name} histogram")
+        for key, h in series.items():
+            cumulative = 0
+            for bound, n in zip(h.buckets, h.counts):
+                cumulative += n
+                lines.append(f"{name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+            lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {h.count}")
+            lines.append(f"{name}_sum{_format_labels(key)} {h.total}")
+            lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+    return "\n".join(lines) + "\n"
+
+def render_summary() -> str:
+    """輸出給控制群組閱讀的摘要 (Markdown)。"""
+    if not ENABLED:
+        return "📈 效能指標未啟用，請在 .env 設定 `METRICS_ENABLED=1`。"
+    lines = ["📈 **效能指標**", ""]
+    for name, series in sorted(histograms.items()):
+        for key, h in sorted(series.items()):
+            avg = h.total / h.count if h.count else 0
+            lines.append(f"• `{name}{_format_labels(key)}`\n  次數 {h.count}，平均 {avg * 1000:.1f}ms，p95 ≤ {h.quantile(0.95) * 1000:.0f}ms")
+    for name, series in sorted(counters.items()):
+        for key, value in sorted(series.items()):
+            lines.append(f"• `{name}{_format_labels(key)}`: {value:g}")
+    if len(lines) == 2:
+        lines.append("尚無任何紀錄。")
+    return "\n".join(lines)
+
+async def run_exporter(path: str, interval: float):
+    """定期把指標寫入 Prometheus 文字檔 (供 node_exporter 的 textfile collector 讀取)。"""
+    from data.persistence import atomic_write_text
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(atomic_write_text, path, render_prometheus())
+        except Exception as e:
+            logging.error(f"寫入效能指標檔 {path} 失敗: {e}")
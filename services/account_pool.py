@@ -0,0 +1,119 @@
+# 檔案：services/account_pool.py
+# 職責：多帳號推播。管理所有已登入的帳號、各自的速率預算與所在群組，
+#       推播時把目標分配給有加入該群組的帳號，遇到洪水限制的帳號暫時停用並改由其他帳號接手。
+
+import logging
+import time
+from pyrogram import Client
+from pyrogram.enums import ChatType
+import config
+from .rate_limiter import RateLimiter
+
+class Account:
+    """
+    一個推播帳號。
+    - primary：主帳號 (控制群組與目標設定所屬的帳號)，視為已加入所有目標。
+    - chats：次要帳號已加入的群組 ID；尚未掃描前為空集合，不會被分配任何目標。
+    """
+
+    def __init__(self, name: str, client: Client, rate_limiter: RateLimiter, primary: bool = False):
+        self.name = name
+        self.client = client
+        self.rate_limiter = rate_limiter
+        self.primary = primary
+        self.chats = set()
+        self.flood_until = 0.0  # 遇到 FloodWait 後，在此 monotonic 時間之前不再分配發送
+
+    def is_member(self, chat_id) -> bool:
+        return self.primary or chat_id in self.chats
+
+    def is_flooded(self, now: float = None) -> bool:
+        return (now if now is not None else time.monotonic()) < self.flood_until
+
+    def mark_flood(self, seconds: float):
+        self.flood_until = max(self.flood_until, time.monotonic() + seconds)
+
+class AccountPool:
+    """所有推播帳號，主帳號排在第一個。"""
+
+    def __init__(self):
+        self.accounts = []
+        self.saved_rate_state = {}  # 帳號名稱 -> 先前保存的速率狀態，帳號加入時套用
+
+    def add(self, name: str, client: Client, rate_limiter: RateLimiter = None, primary: bool = False) -> Account:
+        """加入帳號；未指定 rate_limiter 時依設定建立一個獨立的速率預算。"""
+        account = Account(name, client, rate_limiter or RateLimiter(
+            global_rate=config.BROADCAST_GLOBAL_RATE,
+            global_burst=config.BROADCAST_GLOBAL_BURST,
+            per_chat_interval=config.BROADCAST_PER_CHAT_INTERVAL
+        ), primary=primary)
+        account.rate_limiter.load_state(self.saved_rate_state.get(name))
+        if primary:
+            self.accounts.insert(0, account)
+        else:
+            self.accounts.append(account)
+        return account
+
+    def accounts_for(self, client: Client, default_rate_limiter: RateLimiter) -> list:
+        """
+        返回推播時可使用的帳號。client 已登記在帳號池時使用整個帳號池，
+        否則 (例如基準測試或未登記的客戶端) 只使用 client 本身。
+        """
+        if any(a.client is client for a in self.accounts):
+            return self.accounts
+        return [Account("default", client, default_rate_limiter, primary=True)]
+
+    def load_rate_state(self, state: dict):
+        """載入先前保存的各帳號速率，需在加入帳號前呼叫。"""
+        self.saved_rate_state = dict(state or {})
+
+    def export_rate_state(self) -> dict:
+        """返回所有帳號目前學到的速率，未使用的帳號保留先前保存的值。"""
+        return {**self.saved_rate_state, **{a.name: a.rate_limiter.export_state() for a in self.accounts}}
+
+    def user_ids(self) -> set:
+        """所有已登入帳號的 user id (client.me 在登入後才有值)。"""
+        return {a.client.me.id for a in self.accounts if getattr(a.client, 'me', None)}
+
+    async def refresh_membership(self):
+        """
+        掃描所有次要帳號的對話列表，記錄各自加入的群組/頻道。
+        次要帳號從控制群組複製推播內容，無法讀取控制群組的帳號不會被分配任何目標。
+        """
+        for account in self.accounts:
+            if account.primary:
+                continue
+            chats = set()
+            try:
+                await account.client.get_chat(config.CONTROL_GROUP)
+            except Exception as e:
+                logging.warning(f"帳號 {account.name} 無法讀取控制群組，不分配推播目標: {e}")
+                account.chats = chats
+                continue
+            try:
+                async for dialog in account.client.get_dialogs():
+                    if dialog.chat.type in (ChatType.SUPERGROUP, ChatType.CHANNEL, ChatType.GROUP):
+                        chats.add(dialog.chat.id)
+            except Exception as e:
+                logging.error(f"掃描帳號 {account.name} 的對話列表失敗: {e}")
+                continue
+            account.chats = chats
+            logging.info(f"帳號 {account.name} 已加入 {len(chats)} 個群組/頻道。")
+
+    @staticmethod
+    def assign(accounts: list, chat_ids: list) -> dict:
+        """
+        把每個目標分配給目前負擔最少、且已加入該群組的帳號。
+        返回 chat_id -> 候選帳號列表 (第一個為分配到的帳號，其餘依序作為備援)。
+        """
+        load = {id(a): 0 for a in accounts}
+        plan = {}
+        for chat_id in chat_ids:
+            candidates = sorted((a for a in accounts if a.is_member(chat_id)), key=lambda a: load[id(a)])
+            if candidates:
+                load[id(candidates[0])] += 1
+            plan[chat_id] = candidates
+        return plan
+
+# 所有服務共用同一個帳號池，由 main.py 登記帳號
+account_pool = AccountPool()
@@ -2,54 +2,220 @@
 # 職責：業務邏輯，執行推播、轉發的核心功能。
 
 import asyncio
+import hashlib
 import logging
+import time
 from pyrogram import Client
-from pyrogram.types import Message
-from pyrogram.errors import FloodWait, UserIsBlocked, PeerIdInvalid
+from pyrogram.types import Message, InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAudio
+from pyrogram.errors import FloodWait, UserIsBlocked, PeerIdInvalid, ChannelPrivate, ChatWriteForbidden
+import config
+import metrics
+from .rate_limiter import RateLimiter
+from .account_pool import account_pool
+from .target_registry import target_registry
+
+# 主帳號的速率控制器，所有推播共用，連續多次推播時也不會超出設定的速率
+rate_limiter = RateLimiter(
+    global_rate=config.BROADCAST_GLOBAL_RATE,
+    global_burst=config.BROADCAST_GLOBAL_BURST,
+    per_chat_interval=config.BROADCAST_PER_CHAT_INTERVAL
+)
+
+def resolve_targets(data_manager, target_type: str, target_id: int = None) -> tuple[list, str]:
+    """
+    依目標類型取得推播目標與顯示名稱。
+    target_type 為 'all' (所有群組) 或 'set' (推播組合，需提供 target_id)；找不到時返回空列表。
+    """
+    if target_type == 'all':
+        return config.TARGET_CHANNELS_STR, "所有群組"
+    if target_type == 'set':
+        b_set = data_manager.get_broadcast_set_by_id(target_id)
+        if b_set:
+            return b_set['channels'], f"組合「{b_set['name']}」"
+    return [], ""
+
+def content_fingerprint(message: Message) -> str:
+    """
+    訊息內容的雜湊：文字/說明 (含格式) 加上媒體的 file_unique_id。
+    file_unique_id 對同一個檔案固定不變，因此重新轉寄或由不同帳號讀取的相同內容會得到相同的雜湊。
+    """
+    text = message.text or message.caption or ""
+    parts = [getattr(text, 'html', text)]
+    if message.media:
+        media = getattr(message, message.media.value, None)
+        parts += [message.media.value, getattr(media, 'file_unique_id', "") or ""]
+    if message.media_group_id:
+        parts.append("album")
+    return hashlib.sha256("\x1f".join(parts).encode('utf-8')).hexdigest()
+
+def _to_input_media(message: Message):
+    """把相簿中的一則訊息轉成 InputMedia，直接引用原檔案的 file_id，不需重新上傳。"""
+    caption = {'caption': message.caption or "", 'caption_entities': message.caption_entities}
+    if message.photo:
+        return InputMediaPhoto(message.photo.file_id, **caption)
+    if message.video:
+        return InputMediaVideo(message.video.file_id, **caption)
+    if message.document:
+        return InputMediaDocument(message.document.file_id, **caption)
+    if message.audio:
+        return InputMediaAudio(message.audio.file_id, **caption)
+    return None
+
+async def prepare_payload(client: Client, message: Message, primary: bool = True):
+    """
+    為一則訊息預先準備好發送方式，返回 send(chat_id) 協程函式，所有目標共用。
+    - 相簿 (media group)：只讀取一次整組媒體並建立 InputMedia 清單，
+      之後每個目標只需一次 send_media_group 呼叫 (copy_media_group 每次都會重新讀取整組)。
+    - 其他訊息：使用 message.copy()。
+    primary=False 表示 client 是次要帳號：file_id 只對讀取它的帳號有效，
+    因此改以 copy_message / copy_media_group 從來源聊天複製 (次要帳號必須能讀取來源聊天)。
+    """
+    if not primary:
+        if message.media_group_id:
+            async def copy_album(chat_id):
+                await client.copy_media_group(chat_id, message.chat.id, message.id)
+            return copy_album
+
+        async def copy_by_id(chat_id):
+            await client.copy_message(chat_id, message.chat.id, message.id)
+        return copy_by_id
+
+    if message.media_group_id:
+        try:
+            group = await client.get_media_group(message.chat.id, message.id)
+        except Exception as e:
+            logging.warning(f"讀取相簿失敗，改為只推播單則訊息: {e}")
+            group = []
+        media = [m for m in (_to_input_media(item) for item in group) if m is not None]
+        if media:
+            logging.info(f"推播內容為相簿，共 {len(media)} 個媒體，將以單次呼叫發送到每個目標。")
+
+            async def send_album(chat_id):
+                await client.send_media_group(chat_id, media)
+            return send_album
+
+    async def send_copy(chat_id):
+        await message.copy(chat_id)
+    return send_copy
 
 async def broadcast_to_targets(
-    client: Client, 
-    target_channels: list, 
-    message_to_broadcast: Message
+    client: Client,
+    target_channels: list,
+    message_to_broadcast: Message,
+    before_send=None,
+    on_result=None,
+    ledger=None
 ) -> tuple[int, int]:
     """
     將一則訊息推播到指定的目標頻道列表。
-    使用 message.copy() 能夠處理絕大多數訊息類型。
-    返回 (成功數量, 失敗數量)。
+    使用 message.copy() 能夠處理絕大多數訊息類型；相簿則整組推播 (見 prepare_payload)。
+    帳號池中有多個帳號時，目標會分配給有加入該群組的帳號 (見 account_pool)，
+    每個帳號各自有 BROADCAST_CONCURRENCY 個並行發送與獨立的速率預算。
+    遇到 FloodWait 時，速率控制器會降低該帳號的速率並記住該群組需要較長的間隔，
+    目標改由下一個候選帳號發送，或重新排到最早恢復的帳號 (最多 BROADCAST_FLOOD_RETRIES 次)；
+    次要帳號無法讀取來源聊天或寫入目標時，同樣改由下一個候選帳號 (最後是主帳號) 發送。
+    可選的回呼讓呼叫端記錄進度：
+    - before_send(target)：非同步，每次實際呼叫 API 前執行 (例如先把狀態寫入磁碟)。
+    - on_result(target, status)：status 為 'sent'、'failed'、'retrying' 或 'skipped'。
+    ledger 為發送帳本的 LedgerScope (見 send_ledger)：帳本判斷為重複的目標在呼叫 API 前就略過 (回報 'skipped')。
+    返回 (成功數量, 失敗數量)，略過的目標不計入。
     """
-    success_count, failed_count = 0, 0
-    
-    for channel_id in target_channels:
-        try:
-            # Pyrogram 內部會處理 @username 和 int ID
-            chat_id = int(channel_id) if str(channel_id).startswith('-') else channel_id
-            
-            await message_to_broadcast.copy(chat_id)
-
-            success_count += 1
-            logging.info(f"成功推播到 {chat_id}")
-            
-        except FloodWait as e:
-            logging.warning(f"推播到 {channel_id} 時遭遇洪水限制，將等待 {e.value} 秒。")
-            await asyncio.sleep(e.value)
-            # 重試一次
+    accounts = account_pool.accounts_for(client, rate_limiter)
+    semaphores = {id(a): asyncio.Semaphore(max(config.BROADCAST_CONCURRENCY, 1)) for a in accounts}
+    payloads = {}  # 每個帳號的發送方式只準備一次
+
+    # 目標已在登記表中解析為 chat id，這裡只需查表
+    chat_ids = {channel_id: target_registry.chat_id(channel_id) for channel_id in target_channels}
+    plan = account_pool.assign(accounts, list(chat_ids.values()))
+
+    def report(channel_id, status: str):
+        if on_result:
+            on_result(channel_id, status)
+
+    async def payload_for(account):
+        if id(account) not in payloads:
+            payloads[id(account)] = asyncio.ensure_future(prepare_payload(account.client, message_to_broadcast, account.primary))
+        return await payloads[id(account)]
+
+    async def deliver(account, channel_id, chat_id):
+        # 帳號的洪水限制與群組的下一個時段都在並行名額之外等待，等待中的目標不會阻塞其他目標
+        delay = account.flood_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await account.rate_limiter.acquire(chat_id)
+        # 檢查點同樣在並行名額之外寫入，同一時間的多個目標會合併成一次寫入
+        if before_send:
+            await before_send(channel_id)
+        async with semaphores[id(account)]:
+            send = await payload_for(account)
+            started = time.perf_counter()
             try:
-                await message_to_broadcast.copy(chat_id)
-                success_count += 1
-            except Exception as retry_e:
-                failed_count += 1
-                logging.error(f"重試推播到 {channel_id} 仍然失敗: {retry_e}")
-        
-        except (UserIsBlocked, PeerIdInvalid) as e:
-            failed_count += 1
-            logging.error(f"推播到 {channel_id} 失敗，可能是被封鎖或ID無效: {e}")
+                await send(chat_id)
+            finally:
+                metrics.observe('broadcast_send_seconds', time.perf_counter() - started)
 
-        except Exception as e:
-            failed_count += 1
-            logging.error(f"推播到 {channel_id} 時發生未知錯誤: {e}")
-            
+    async def send_one(channel_id):
+        chat_id = chat_ids[channel_id]
+        if ledger and not ledger.reserve(chat_id):
+            logging.info(f"{chat_id} 已收到相同內容，略過重複發送。")
+            report(channel_id, 'skipped')
+            metrics.inc('broadcast_sends_total', status='skipped')
+            return None
+        ok = False
+        try:
+            ok = await send_with_retries(channel_id, chat_id)
         finally:
-            # 在每次發送後都短暫延遲，以避免因發送過快而被 Telegram 限制
-            await asyncio.sleep(1.5)
-            
-    return success_count, failed_count
+            # 失敗或被取消時釋放預留，之後可以再次發送
+            if ledger and ok:
+                ledger.commit(chat_id)
+            elif ledger:
+                ledger.release(chat_id)
+        report(channel_id, 'sent' if ok else 'failed')
+        metrics.inc('broadcast_sends_total', status='sent' if ok else 'failed')
+        return ok
+
+    async def send_with_retries(channel_id, chat_id) -> bool:
+        candidates = plan[chat_id] or accounts[:1]
+        ok, floods, tried = False, 0, set()
+        while True:
+            now = time.monotonic()
+            ready = [a for a in candidates if not a.is_flooded(now) and id(a) not in tried]
+            # 沒有可立即使用的帳號時，改排給最早恢復的帳號
+            account = ready[0] if ready else min(candidates, key=lambda a: a.flood_until)
+            tried.add(id(account))
+            try:
+                await deliver(account, channel_id, chat_id)
+                account.rate_limiter.on_success(chat_id)
+                logging.info(f"成功推播到 {chat_id}" + (f" (帳號 {account.name})" if len(accounts) > 1 else ""))
+                ok = True
+                break
+
+            except FloodWait as e:
+                floods += 1
+                logging.warning(f"帳號 {account.name} 推播到 {channel_id} 時遭遇洪水限制 ({e.value} 秒)，將重新排程。")
+                account.mark_flood(e.value)
+                account.rate_limiter.on_flood(chat_id, e.value)
+                report(channel_id, 'retrying')
+                metrics.inc('broadcast_flood_wait_total')
+                metrics.inc('broadcast_flood_wait_seconds_total', e.value)
+                if floods > config.BROADCAST_FLOOD_RETRIES:
+                    logging.error(f"推播到 {channel_id} 連續 {floods} 次遭遇洪水限制，放棄發送。")
+                    break
+
+            except (UserIsBlocked, PeerIdInvalid, ChannelPrivate, ChatWriteForbidden) as e:
+                # 次要帳號可能讀不到來源聊天或已被移出目標，改由下一個候選帳號 (最後是主帳號) 發送
+                fallback = [a for a in candidates + accounts[:1] if id(a) not in tried]
+                if not account.primary and fallback:
+                    logging.warning(f"帳號 {account.name} 推播到 {channel_id} 失敗，改由其他帳號發送: {e}")
+                    candidates = fallback
+                    continue
+                logging.error(f"推播到 {channel_id} 失敗，可能是被封鎖或ID無效: {e}")
+                break
+
+            except Exception as e:
+                logging.error(f"推播到 {channel_id} 時發生未知錯誤: {e}")
+                break
+        return ok
+
+    results = await asyncio.gather(*(send_one(channel_id) for channel_id in target_channels))
+    return results.count(True), results.count(False)
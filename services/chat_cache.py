@@ -0,0 +1,48 @@
+# 檔案：services/chat_cache.py
+# 職責：群組/頻道資訊 (名稱、人數、類型) 的共用快取，具備過期時間與容量上限。
+
+import time
+from collections import OrderedDict
+import config
+
+class ChatMetadataCache:
+    """以 LRU 淘汰的 TTL 快取，超過 max_size 時移除最久未使用的項目；個別項目可指定較短的有效時間。"""
+
+    def __init__(self, ttl: float, max_size: int):
+        self.ttl = ttl
+        self.max_size = max(max_size, 1)
+        self.entries = OrderedDict()  # chat_id -> (過期時間, 資訊 dict)
+        self.version = 0  # 每次寫入或清除都會增加，供面板快取判斷群組資訊是否改變
+
+    def get(self, chat_id):
+        """取得未過期的資訊，沒有或已過期時返回 None。"""
+        item = self.entries.get(chat_id)
+        if item is None:
+            return None
+        expires_at, details = item
+        if time.monotonic() > expires_at:
+            del self.entries[chat_id]
+            return None
+        self.entries.move_to_end(chat_id)
+        return details
+
+    def put(self, chat_id, details: dict, ttl: float = None):
+        """ttl 未指定時使用快取的預設有效時間。"""
+        old = self.entries.get(chat_id)
+        if old is None or old[1] != details:
+            self.version += 1
+        self.entries[chat_id] = (time.monotonic() + (self.ttl if ttl is None else ttl), details)
+        self.entries.move_to_end(chat_id)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, chat_id=None):
+        """清除單一項目，或在未指定時清除全部。"""
+        self.version += 1
+        if chat_id is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(chat_id, None)
+
+# 所有服務共用同一份快取
+chat_cache = ChatMetadataCache(ttl=config.CHAT_CACHE_TTL, max_size=config.CHAT_CACHE_MAX_SIZE)
@@ -0,0 +1,124 @@
+# 檔案：services/health_monitor.py
+# 職責：目標群組健康監控。目標登記表每次在背景更新群組資訊後，記錄各群組人數的精簡時間序列，
+#       只把人數變化與新出現的連線問題回報到控制群組；群組連線測試直接讀取這裡保存的最新結果。
+
+import bisect
+import logging
+import time
+from datetime import datetime
+from pyrogram import Client
+import config
+from data.data_manager import DataManager
+from .target_registry import target_registry
+
+DAY = 24 * 60 * 60
+
+def record_point(history: list, timestamp: float, count: int, retention_seconds: float):
+    """
+    history 為依時間排序的 [[timestamp, 人數], ...]：只在人數改變時新增，且每天最多一點
+    (同一天內的變化直接更新當天的點)。超過保留期的點會刪除，但保留保留期開始時的數值。
+    """
+    ts = int(timestamp)
+    if history and history[-1][0] // DAY == ts // DAY:
+        history[-1] = [ts, count]
+        if len(history) > 1 and history[-2][1] == count:
+            history.pop()
+    elif not history or history[-1][1] != count:
+        history.append([ts, count])
+    cutoff = timestamp - retention_seconds
+    while len(history) > 1 and history[1][0] <= cutoff:
+        history.pop(0)
+
+def value_at(history: list, timestamp: float):
+    """返回 timestamp 當時的人數 (二分搜尋)，當時尚無紀錄則為 None。"""
+    pos = bisect.bisect_right(history, [timestamp, float('inf')])
+    return history[pos - 1][1] if pos else None
+
+def health_rows(health: dict, raw_targets: list, since: float) -> list:
+    """依目標順序整理最近一次檢查的結果，change 為 since 以來的人數變化 (無紀錄時為 None)。"""
+    targets = health.get('targets', {})
+    rows = []
+    for raw in raw_targets:
+        entry = targets.get(str(target_registry.chat_id(raw)))
+        if entry is None:
+            continue
+        before = value_at(entry['history'], since)
+        members = entry.get('members')
+        rows.append({
+            'title': entry.get('title') or str(raw),
+            'members': members,
+            'error': entry.get('error'),
+            'change': members - before if members is not None and before is not None else None
+        })
+    return rows
+
+class ChannelHealthMonitor:
+    """
+    直接維護 DataManager 的 'channel_health' 區段：
+    {'checked_at': ISO 時間, 'targets': {chat id: {'title', 'members', 'error', 'broken_since', 'reported', 'history'}}}
+    reported 為上次回報時的人數，與目前人數的差距達到 HEALTH_MIN_MEMBER_DELTA 才會再次回報；
+    連線問題只在剛出現與恢復時各回報一次。
+    """
+
+    def __init__(self, client: Client, data_manager: DataManager):
+        self.client = client
+        self.data_manager = data_manager
+
+    async def on_refresh(self, raw_targets: list, details: list):
+        """作為 TargetRegistry.run_refresher 的 on_refresh：記錄這次更新的結果並回報變化。"""
+        now = time.time()
+        checked_at = datetime.fromtimestamp(now).isoformat()
+        previous = self.data_manager.get_channel_health().get('targets', {})
+        targets, broken, recovered, changes = {}, [], [], []
+
+        for raw, info in zip(raw_targets, details):
+            key = str(target_registry.chat_id(raw))
+            entry = previous.get(key) or {'title': None, 'members': None, 'error': None, 'broken_since': None, 'reported': None, 'history': []}
+            targets[key] = entry
+            error = info.get('error')
+            if error:
+                # 無法訪問時保留上次取得的名稱
+                entry['title'] = entry['title'] or str(raw)
+                entry['error'] = error
+                if entry['broken_since'] is None:
+                    entry['broken_since'] = checked_at
+                    broken.append(f"• {entry['title']} ({raw}): {error}")
+                continue
+
+            entry['title'] = info['title']
+            if entry['broken_since'] is not None:
+                recovered.append(f"• {entry['title']}")
+            entry['error'] = entry['broken_since'] = None
+            count = info.get('members_count')
+            if not isinstance(count, int):
+                continue
+            entry['members'] = count
+            record_point(entry['history'], now, count, config.HEALTH_HISTORY_DAYS * DAY)
+            if entry['reported'] is None:
+                entry['reported'] = count
+            elif abs(count - entry['reported']) >= max(config.HEALTH_MIN_MEMBER_DELTA, 1):
+                changes.append(f"• {entry['title']}: {entry['reported']} → {count} ({count - entry['reported']:+d})")
+                entry['reported'] = count
+
+        # 已從 TARGET_CHANNELS 移除的目標不再保留
+        self.data_manager.save_channel_health({'checked_at': checked_at, 'targets': targets})
+        if broken or recovered or changes:
+            await self._report(broken, recovered, changes)
+
+    async def _report(self, broken: list, recovered: list, changes: list):
+        sections = []
+        if broken:
+            sections.append("❌ 新的連線問題:\n" + "\n".join(broken))
+        if recovered:
+            sections.append("✅ 已恢復連線:\n" + "\n".join(recovered))
+        if changes:
+            sections.append("👥 人數變化:\n" + "\n".join(changes))
+        text = f"🩺 群組健康檢查 ({datetime.now():%m-%d %H:%M})\n\n" + "\n\n".join(sections)
+        if len(text) > 4096:
+            text = text[:4090] + "\n..."
+        self.data_manager.add_log('health_check', 'FAILURE' if broken else 'INFO',
+                                  f"群組健康檢查：{len(broken)} 個新的連線問題，{len(recovered)} 個恢復，{len(changes)} 個人數變化。")
+        try:
+            await self.client.send_message(config.CONTROL_GROUP, text)
+        except Exception as e:
+            logging.error(f"回報群組健康檢查結果失敗: {e}")
@@ -1,59 +1,120 @@
 # 檔案：services/info_service.py
 # 職責：業務邏輯，獲取統計數據、群組資訊、掃描群組等。
 
+import asyncio
 import logging
 from datetime import datetime, timedelta
 from pyrogram import Client
 from pyrogram.enums import ChatType
 from data.data_manager import DataManager
+from .chat_cache import chat_cache
+from .target_registry import target_registry
 import config
+import metrics
 
+@metrics.timed('service_latency_seconds', service='get_system_stats')
 async def get_system_stats(data_manager: DataManager) -> dict:
     """獲取用於主面板顯示的系統統計數據。"""
     sets = data_manager.get_broadcast_sets()
-    now = datetime.now()
-    time_24_hours_ago = now - timedelta(hours=24)
-    
-    logs_24h = [
-        log for log in data_manager.get_logs() 
-        if datetime.fromisoformat(log['time']) > time_24_hours_ago
-    ]
-    
     return {
         "set_count": len(sets),
         "total_target_count": len(config.TARGET_CHANNELS_STR),
-        "today_broadcasts": len(logs_24h)
+        "today_broadcasts": data_manager.count_recent_logs('broadcast'),
+        "week_broadcasts": data_manager.count_logs(datetime.now() - timedelta(days=7), action='broadcast')
     }
 
-async def get_all_channel_details(client: Client, channel_ids: list) -> list:
-    """獲取所有目標頻道的詳細資訊 (ID, 名稱, 人數)。"""
-    details = []
-    for channel_id_str in channel_ids:
-        try:
-            chat_id = int(channel_id_str) if channel_id_str.startswith('-') else channel_id_str
-            chat = await client.get_chat(chat_id)
-            details.append({
-                "id": chat.id,
-                "title": chat.title or "無標題",
-                "members_count": getattr(chat, 'members_count', 'N/A')
-            })
-        except Exception as e:
-            logging.error(f"無法獲取頻道 {channel_id_str} 的資訊: {e}")
-            details.append({
-                "id": channel_id_str,
-                "title": f"錯誤 ({channel_id_str})",
-                "members_count": "無法訪問"
-            })
-    return details
+async def _fetch_channel_details(client: Client, channel_id_str) -> dict:
+    try:
+        chat = await client.get_chat(target_registry.chat_id(channel_id_str))
+        return {
+            "id": chat.id,
+            "title": chat.title or "無標題",
+            "members_count": getattr(chat, 'members_count', 'N/A'),
+            "type": chat.type.value if chat.type else "unknown"
+        }
+    except Exception as e:
+        logging.error(f"無法獲取頻道 {channel_id_str} 的資訊: {e}")
+        return {
+            "id": channel_id_str,
+            "title": f"錯誤 ({channel_id_str})",
+            "members_count": "無法訪問",
+            "type": "unknown",
+            "error": type(e).__name__
+        }
+
+@metrics.timed('service_latency_seconds', service='get_all_channel_details')
+async def get_all_channel_details(client: Client, channel_ids: list, force_refresh: bool = False) -> list:
+    """
+    獲取所有目標頻道的詳細資訊 (ID, 名稱, 人數, 類型)。
+    優先使用共用快取，未命中的部分以有限的並行數一次查詢。
+    """
+    keys = [target_registry.chat_id(c) for c in channel_ids]
+    details = {}
+    if not force_refresh:
+        for key in keys:
+            cached = chat_cache.get(key)
+            if cached is not None:
+                details[key] = cached
+
+    missing = {key: channel_id for key, channel_id in zip(keys, channel_ids) if key not in details}
+    if missing:
+        semaphore = asyncio.Semaphore(max(config.CHAT_FETCH_CONCURRENCY, 1))
+
+        async def fetch(channel_id):
+            async with semaphore:
+                return await _fetch_channel_details(client, channel_id)
+
+        fetched = await asyncio.gather(*(fetch(channel_id) for channel_id in missing.values()))
+        for key, info in zip(missing, fetched):
+            # 查詢失敗多半是暫時性的，只短暫快取，避免同一個錯誤在介面上停留整個 CHAT_CACHE_TTL
+            chat_cache.put(key, info, ttl=config.CHAT_CACHE_ERROR_TTL if 'error' in info else None)
+            details[key] = info
+
+    return [details[key] for key in keys]
+
+async def search_channels(client: Client, channel_ids: list, keyword: str = None) -> list:
+    """
+    依關鍵字篩選目標 (不分大小寫，比對名稱與 ID)，返回符合的原始目標列表。
+    沒有關鍵字時直接返回全部，不需要任何群組資訊；有關鍵字時名稱取自共用快取。
+    """
+    if not keyword:
+        return list(channel_ids)
+    keyword = keyword.lower()
+    details = await get_all_channel_details(client, channel_ids)
+    return [
+        channel_id for channel_id, info in zip(channel_ids, details)
+        if keyword in f"{info['title']} {channel_id}".lower()
+    ]
 
 # --- 【新功能】---
-async def scan_all_dialogs(client: Client) -> list:
+def _dialog_marker(dialog) -> list:
+    """以最新訊息的 id 與時間作為對話是否變更的標記。"""
+    top = dialog.top_message
+    if not top:
+        return [0, 0]
+    return [top.id, int(top.date.timestamp()) if top.date else 0]
+
+@metrics.timed('service_latency_seconds', service='scan_all_dialogs')
+async def scan_all_dialogs(client: Client, data_manager: DataManager = None, full: bool = False) -> list:
     """
     掃描您帳號中所有的對話，並篩選出群組和頻道。
     返回一個包含詳細資訊的列表。
+    提供 data_manager 時會使用上次保存的對話快照做增量掃描：對話列表依最新訊息時間排序，
+    遇到第一個未變更 (且未置頂) 的對話即可停止，其餘沿用快照。full=True 時強制完整掃描。
+    注意：增量掃描無法察覺已退出的群組，需要時請使用完整掃描。
     """
-    scanned_groups = []
+    snapshot = data_manager.get_dialog_snapshot() if data_manager else None
+    incremental = bool(snapshot) and not full
+    old_markers = snapshot['markers'] if incremental else {}
+
+    markers, scanned_groups, stopped_early, visited = {}, [], False, 0
     async for dialog in client.get_dialogs():
+        key, marker = str(dialog.chat.id), _dialog_marker(dialog)
+        if incremental and not dialog.is_pinned and old_markers.get(key) == marker:
+            stopped_early = True
+            break
+        visited += 1
+        markers[key] = marker
         # 我們只關心超級群組和頻道
         if dialog.chat.type in [ChatType.SUPERGROUP, ChatType.CHANNEL]:
             scanned_groups.append({
@@ -61,5 +122,19 @@ async def scan_all_dialogs(client: Client) -> list:
                 "title": dialog.chat.title or "無標題",
                 "type": "超級群組" if dialog.chat.type == ChatType.SUPERGROUP else "頻道"
             })
-    logging.info(f"掃描完成，共找到 {len(scanned_groups)} 個群組/頻道。")
+
+    if stopped_early:
+        # 未掃描到的對話沒有變化，沿用快照中的資料 (保持原本的排序)
+        updated_ids = {g['id'] for g in scanned_groups}
+        scanned_groups += [g for g in snapshot['dialogs'] if g['id'] not in updated_ids]
+        markers = {**old_markers, **markers}
+
+    if data_manager:
+        data_manager.save_dialog_snapshot({
+            'scanned_at': datetime.now().isoformat(),
+            'markers': markers,
+            'dialogs': scanned_groups
+        })
+    mode = f"增量掃描 (檢查 {visited} 個對話)" if stopped_early else "完整掃描"
+    logging.info(f"{mode}完成，共找到 {len(scanned_groups)} 個群組/頻道。")
     return scanned_groups
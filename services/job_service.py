@@ -0,0 +1,210 @@
+# 檔案：services/job_service.py
+# 職責：業務邏輯，可續傳的推播工作。每次推播都存成一筆工作並記錄每個目標的狀態，
+#       程式中斷後重新啟動時，從最後的檢查點繼續推播。
+
+import asyncio
+import logging
+from datetime import datetime
+from pyrogram import Client
+from pyrogram.enums import ParseMode
+from pyrogram.types import Message
+from data.data_manager import DataManager
+from . import broadcast_service
+from .account_pool import account_pool
+from .target_registry import target_registry
+from .send_ledger import send_ledger
+import config
+
+# 工作狀態：running、done、failed (來源訊息不存在)、cancelled (以 .cancel 停止，不會自動恢復)
+# 目標狀態：pending (尚未發送)、sending (已開始發送，結果未知)、sent、failed、retrying、
+#           skipped (發送帳本判斷為重複，未呼叫 API)
+UNFINISHED_TARGET_STATUSES = ('pending', 'sending', 'retrying')
+
+class BroadcastJobService:
+    """
+    建立、執行與恢復推播工作。
+    每個目標在實際呼叫 API 前會先標記為 'sending' 並寫入磁碟 (以 journal 附加一筆紀錄，不重寫整個工作)；
+    恢復時對仍為 'sending' 的目標檢查聊天記錄，確認已送達者不會重複發送。
+    工作結束後移到歷史紀錄，推播期間寫入的資料量與歷史紀錄的多寡無關。
+    """
+
+    def __init__(self, client: Client, data_manager: DataManager):
+        self.client = client
+        self.data_manager = data_manager
+        self.active = {}  # job_id -> (背景 asyncio.Task, 啟動者 user_id)
+        self.cancel_requested = set()  # 以 .cancel 停止的工作 id；其他原因的取消 (例如程式結束) 不會結束工作
+
+    def create_job(self, message: Message, target_channels: list, target_name: str, user: str = "System",
+                   dedup_window: float = None) -> dict:
+        """
+        為一則訊息建立推播工作，所有目標的初始狀態為 pending。
+        dedup_window 為略過其他工作近期已送達內容的秒數 (見 send_ledger)，預設為 BROADCAST_DEDUP_WINDOW。
+        """
+        now = datetime.now().isoformat()
+        job_id = self.data_manager.add_broadcast_job({
+            'status': 'running',
+            'source_chat_id': message.chat.id,
+            'source_message_id': message.id,
+            'content_hash': broadcast_service.content_fingerprint(message),
+            'dedup_window': config.BROADCAST_DEDUP_WINDOW if dedup_window is None else dedup_window,
+            'target_name': target_name,
+            'user': user,
+            'created_at': now,
+            'updated_at': now,
+            'targets': {str(t): {'status': 'pending', 'time': None} for t in target_channels}
+        })
+        return self.data_manager.get_broadcast_job_by_id(job_id)
+
+    @staticmethod
+    def count_results(job: dict) -> tuple[int, int]:
+        statuses = [t['status'] for t in job['targets'].values()]
+        return statuses.count('sent'), statuses.count('failed')
+
+    @staticmethod
+    def count_skipped(job: dict) -> int:
+        return sum(1 for t in job['targets'].values() if t['status'] == 'skipped')
+
+    def _set_target_status(self, job: dict, target, status: str):
+        self.data_manager.update_job_target(job['id'], str(target), status)
+
+    def _finish(self, job: dict, status: str):
+        job['status'] = status
+        self.data_manager.update_broadcast_job(job['id'], updated_at=datetime.now().isoformat())
+        # 結束工作時會清空 journal，帳本 (已淘汰過期紀錄) 隨之整段寫入
+        self.data_manager.save_send_ledger(send_ledger.entries)
+        self.data_manager.finish_broadcast_job(job['id'], config.BROADCAST_JOB_HISTORY)
+
+    async def run_job(self, job: dict, message: Message = None, on_progress=None) -> tuple[int, int]:
+        """
+        推播工作中所有尚未完成的目標，完成後返回整個工作的 (成功數量, 失敗數量)。
+        message 為 None 時會依工作記錄的來源重新讀取訊息。
+        on_progress(job) 在每個目標有結果時呼叫 (需自行節流)。
+        以 cancel_jobs() 取消時工作標記為 cancelled；其他原因的取消 (例如程式結束) 工作維持 running，
+        下次啟動時從檢查點恢復。兩者都會重新拋出 CancelledError。
+        """
+        if message is None:
+            message = await self.client.get_messages(job['source_chat_id'], job['source_message_id'])
+            if not message or message.empty:
+                logging.error(f"推播工作 #{job['id']} 的來源訊息已不存在，無法繼續。")
+                self._finish(job, 'failed')
+                return self.count_results(job)
+
+        pending = [t for t, info in job['targets'].items() if info['status'] in UNFINISHED_TARGET_STATUSES]
+
+        async def before_send(target):
+            # 先把 'sending' 寫入磁碟再呼叫 API，中斷後才能辨識出結果未知的目標
+            self._set_target_status(job, target, 'sending')
+            await self.data_manager.flush()
+
+        def on_result(target, status: str):
+            self._set_target_status(job, target, status)
+            if on_progress:
+                on_progress(job)
+
+        # 舊版建立的工作沒有內容雜湊，直接從訊息計算
+        content_hash = job.get('content_hash') or broadcast_service.content_fingerprint(message)
+        # 每筆成功發送只附加一筆 journal 紀錄，整個帳本在工作結束時才寫入
+        ledger = send_ledger.scope(content_hash, job['id'], job.get('dedup_window', config.BROADCAST_DEDUP_WINDOW),
+                                   on_commit=self.data_manager.record_send)
+        try:
+            await broadcast_service.broadcast_to_targets(
+                self.client, pending, message,
+                before_send=before_send,
+                on_result=on_result,
+                ledger=ledger
+            )
+        except asyncio.CancelledError:
+            # 已標記 'sending' 的目標維持原狀，代表結果未知
+            if job['id'] in self.cancel_requested:
+                self._finish(job, 'cancelled')
+                logging.info(f"推播工作 #{job['id']} 已取消。")
+            else:
+                logging.info(f"推播工作 #{job['id']} 已中斷，下次啟動時繼續。")
+            raise
+        finally:
+            # 保存這次推播學到的速率 (包括被取消、失敗或中斷時，這時通常剛遇到洪水限制)，
+            # 下次推播 (包括重啟後) 直接從安全速率開始
+            self.data_manager.save_rate_state(account_pool.export_rate_state())
+
+        self._finish(job, 'done')
+        return self.count_results(job)
+
+    def start_job(self, job: dict, message: Message = None, owner: int = None, on_progress=None) -> asyncio.Task:
+        """在背景執行推播工作並返回其 Task，執行期間可用 cancel_jobs() 停止。"""
+        task = asyncio.create_task(self.run_job(job, message, on_progress))
+        self.active[job['id']] = (task, owner)
+
+        def on_done(_):
+            self.active.pop(job['id'], None)
+            self.cancel_requested.discard(job['id'])
+        task.add_done_callback(on_done)
+        return task
+
+    def cancel_jobs(self, owner: int = None, job_id: int = None) -> list:
+        """取消指定的工作，或 owner 啟動的所有執行中工作，返回被取消的工作 id。"""
+        cancelled = []
+        for active_id, (task, active_owner) in list(self.active.items()):
+            if (job_id is not None and active_id == job_id) or (job_id is None and active_owner == owner):
+                self.cancel_requested.add(active_id)
+                task.cancel()
+                cancelled.append(active_id)
+        return cancelled
+
+    async def stop(self):
+        """
+        程式結束前呼叫 (需在 DataManager.close() 之前)：中斷所有執行中的工作並等待它們結束。
+        工作維持 running，最後的檢查點隨 close() 寫入，下次啟動時恢復。
+        """
+        tasks = [task for task, _ in self.active.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _was_delivered(self, target, since: str) -> bool:
+        """檢查目標聊天中是否已有本帳號 (或帳號池中任一帳號) 在 since 之後發出的訊息。"""
+        chat_id = target_registry.chat_id(target)
+        since_time = datetime.fromisoformat(since)
+        pool_user_ids = account_pool.user_ids()
+        try:
+            async for msg in self.client.get_chat_history(chat_id, limit=config.BROADCAST_RESUME_HISTORY_LIMIT):
+                if msg.date and msg.date < since_time:
+                    break
+                if msg.outgoing or (msg.from_user and msg.from_user.id in pool_user_ids):
+                    return True
+        except Exception as e:
+            logging.warning(f"無法檢查 {target} 的聊天記錄，將重新發送: {e}")
+        return False
+
+    async def resume_unfinished(self):
+        """程式啟動時呼叫：繼續所有中斷的推播工作，並把結果回報到控制群組。"""
+        for job in [j for j in self.data_manager.get_broadcast_jobs() if j.get('status') == 'running']:
+            in_doubt = [t for t, info in job['targets'].items() if info['status'] == 'sending']
+            for target in in_doubt:
+                if await self._was_delivered(target, job['targets'][target]['time']):
+                    self._set_target_status(job, target, 'sent')
+            remaining = sum(1 for info in job['targets'].values() if info['status'] in UNFINISHED_TARGET_STATUSES)
+            logging.info(f"恢復推播工作 #{job['id']}，剩餘 {remaining} 個目標。")
+
+            try:
+                success, failed = await self.start_job(job)
+            except asyncio.CancelledError:
+                if job.get('status') == 'running':
+                    # 不是以 .cancel 停止這個工作，而是恢復任務本身被取消 (程式結束)，不再啟動其他工作
+                    raise
+                self.data_manager.add_log('broadcast_resume', 'CANCELLED', f"恢復的推播工作 #{job['id']} (「{job['target_name']}」) 已取消。", job.get('user', 'System'))
+                continue
+            except Exception as e:
+                logging.error(f"恢復推播工作 #{job['id']} 失敗: {e}", exc_info=True)
+                continue
+            skipped = self.count_skipped(job)
+            log_status = 'SUCCESS' if failed == 0 else 'PARTIAL_SUCCESS' if success > 0 else 'FAILURE'
+            self.data_manager.add_log('broadcast_resume', log_status, f"恢復推播工作 #{job['id']} (「{job['target_name']}」)。結果: 成功 {success}, 失敗 {failed}, 略過 {skipped}。", job.get('user', 'System'))
+            try:
+                await self.client.send_message(
+                    config.CONTROL_GROUP,
+                    f"♻️ **已恢復中斷的推播工作 #{job['id']}**\n\n- **目標**: {job['target_name']}\n- **成功**: {success} 個\n- **失敗**: {failed} 個"
+                    + (f"\n- **略過 (重複)**: {skipped} 個" if skipped else ""),
+                    parse_mode=ParseMode.MARKDOWN
+                )
+            except Exception as e:
+                logging.error(f"回報推播工作 #{job['id']} 恢復結果失敗: {e}")
@@ -0,0 +1,99 @@
+# 檔案：services/rate_limiter.py
+# 職責：速率控制，提供全域令牌桶與每個群組的最短發送間隔，並依 FloodWait 自動調整。
+
+import asyncio
+import logging
+import time
+
+class TokenBucket:
+    """標準令牌桶：以固定速率補充令牌，最多累積 burst 個。"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """取得一個令牌，不足時等待到下一個令牌補充為止。"""
+        async with self.lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class RateLimiter:
+    """
+    推播用的自適應速率控制器 (AIMD)。
+    全域令牌桶決定整體吞吐量，每個群組另有最短發送間隔，避免對單一群組連發。
+    - 遇到 FloodWait：全域速率減半、該群組的間隔加倍，並把該群組的下一個時段延後到等待結束。
+    - 每次發送成功：全域速率加回 RATE_INCREASE，群組間隔減少 INTERVAL_DECREASE，直到回到設定值。
+    學到的速率可用 export_state()/load_state() 保存，重啟後直接從已知的安全速率開始。
+    """
+
+    RATE_INCREASE = 0.1       # 每次成功增加的全域速率 (次/秒)
+    INTERVAL_DECREASE = 0.1   # 每次成功減少的群組間隔 (秒)
+    MIN_RATE_RATIO = 0.05     # 全域速率最低降到設定值的此比例
+    MAX_CHAT_INTERVAL = 3600  # 群組間隔的上限 (秒)
+
+    def __init__(self, global_rate: float, global_burst: int, per_chat_interval: float):
+        self.bucket = TokenBucket(global_rate, global_burst)
+        self.max_rate = self.bucket.rate
+        self.per_chat_interval = per_chat_interval
+        self.chat_intervals = {}  # chat_id -> 學到的間隔 (只記錄大於 per_chat_interval 者)
+        self.next_allowed = {}  # chat_id -> 下一次允許發送的 monotonic 時間
+
+    def interval_for(self, chat_id) -> float:
+        return self.chat_intervals.get(chat_id, self.per_chat_interval)
+
+    async def acquire(self, chat_id):
+        """等待直到可以對 chat_id 發送下一則訊息。"""
+        now = time.monotonic()
+        ready_at = self.next_allowed.get(chat_id, now)
+        # 先佔住此群組的下一個時段，讓同一群組的並行請求自動排隊
+        self.next_allowed[chat_id] = max(ready_at, now) + self.interval_for(chat_id)
+        if ready_at > now:
+            await asyncio.sleep(ready_at - now)
+        await self.bucket.acquire()
+
+    def on_success(self, chat_id):
+        self.bucket.rate = min(self.max_rate, self.bucket.rate + self.RATE_INCREASE)
+        interval = self.chat_intervals.get(chat_id)
+        if interval is not None:
+            interval -= self.INTERVAL_DECREASE
+            if interval <= self.per_chat_interval:
+                del self.chat_intervals[chat_id]
+            else:
+                self.chat_intervals[chat_id] = interval
+
+    def on_flood(self, chat_id, wait: float):
+        """記錄一次 FloodWait：降低速率，並把此群組的下一個時段排到等待結束之後。"""
+        self.bucket.rate = max(self.max_rate * self.MIN_RATE_RATIO, self.bucket.rate / 2)
+        interval = max(self.interval_for(chat_id) * 2, self.per_chat_interval, 1.0)
+        self.chat_intervals[chat_id] = min(interval, self.MAX_CHAT_INTERVAL)
+        self.next_allowed[chat_id] = max(self.next_allowed.get(chat_id, 0), time.monotonic() + wait)
+        logging.info(f"速率控制：全域速率降為 {self.bucket.rate:.2f} 次/秒，{chat_id} 的間隔調整為 {self.chat_intervals[chat_id]:.1f} 秒。")
+
+    def export_state(self) -> dict:
+        return {
+            'rate': self.bucket.rate,
+            'chat_intervals': {str(chat_id): interval for chat_id, interval in self.chat_intervals.items()}
+        }
+
+    def load_state(self, state: dict):
+        """載入先前學到的速率；設定值調低後，學到的速率也不會超過新的設定值。"""
+        if not state:
+            return
+        self.bucket.rate = min(self.max_rate, max(state.get('rate', self.max_rate), self.max_rate * self.MIN_RATE_RATIO))
+        for chat_id, interval in state.get('chat_intervals', {}).items():
+            if interval > self.per_chat_interval:
+                key = int(chat_id) if chat_id.lstrip('-').isdigit() else chat_id
+                self.chat_intervals[key] = min(interval, self.MAX_CHAT_INTERVAL)
@@ -0,0 +1,232 @@
+# 檔案：services/schedule_service.py
+# 職責：業務邏輯，定時推播。排程資料存於 DataManager 的 'schedules' 區段，
+#       啟動時依此重建 APScheduler 的工作，因此重啟後排程不會遺失。
+
+import asyncio
+import logging
+import random
+import re
+from datetime import datetime, timedelta
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.date import DateTrigger
+from apscheduler.triggers.interval import IntervalTrigger
+from pyrogram import Client
+from pyrogram.enums import ParseMode
+from data.data_manager import DataManager
+from . import broadcast_service
+from .job_service import BroadcastJobService
+import config
+
+SCHEDULE_SPEC_HELP = (
+    "• 單次：`2025-07-01 09:30`\n"
+    "• 每天：`每天 09:30`\n"
+    "• 固定間隔：`每 90 分鐘`"
+)
+
+def parse_schedule_spec(text: str) -> dict:
+    """
+    將使用者輸入的時間描述轉為排程欄位。
+    支援「YYYY-MM-DD HH:MM」(單次)、「每天 HH:MM」(每日) 與「每 N 分鐘」(固定間隔)。
+    格式錯誤時拋出 ValueError。
+    """
+    text = text.strip()
+    match = re.fullmatch(r'每天\s*(\d{1,2}):(\d{2})', text)
+    if match:
+        hour, minute = int(match.group(1)), int(match.group(2))
+        if hour > 23 or minute > 59:
+            raise ValueError("時間格式不正確。")
+        return {'kind': 'daily', 'time': f"{hour:02d}:{minute:02d}"}
+
+    match = re.fullmatch(r'每\s*(\d+)\s*分鐘', text)
+    if match:
+        minutes = int(match.group(1))
+        if minutes < 1:
+            raise ValueError("間隔至少需為 1 分鐘。")
+        return {'kind': 'interval', 'minutes': minutes}
+
+    try:
+        run_at = datetime.strptime(text, "%Y-%m-%d %H:%M")
+    except ValueError:
+        raise ValueError("無法辨識的時間格式。") from None
+    if run_at <= datetime.now():
+        raise ValueError("指定的時間已經過去。")
+    return {'kind': 'once', 'run_at': run_at.isoformat()}
+
+def describe_schedule(schedule: dict) -> str:
+    """返回排程時間的簡短描述，供面板顯示。"""
+    kind = schedule.get('kind')
+    if kind == 'daily':
+        return f"每天 {schedule['time']}"
+    if kind == 'interval':
+        return f"每 {schedule['minutes']} 分鐘"
+    return f"單次 {schedule['run_at'][:16].replace('T', ' ')}"
+
+class ScheduleService:
+    """
+    管理所有定時推播：
+    - 錯過的執行 (程式停機期間) 若仍在 SCHEDULE_MISFIRE_GRACE 秒內，啟動後會補執行一次。
+    - 每個工作都會加上 0 ~ SCHEDULE_JITTER 秒的隨機延遲，避免同一分鐘的多個排程同時推播。
+    """
+
+    def __init__(self, client: Client, data_manager: DataManager, job_service: BroadcastJobService = None):
+        self.client = client
+        self.data_manager = data_manager
+        self.job_service = job_service or BroadcastJobService(client, data_manager)
+        self.scheduler = AsyncIOScheduler(job_defaults={
+            'coalesce': True,
+            'max_instances': 1,
+            'misfire_grace_time': config.SCHEDULE_MISFIRE_GRACE
+        })
+
+    def start(self):
+        """啟動排程器並載入所有已儲存的排程，需在事件迴圈中呼叫。"""
+        self.scheduler.start()
+        for schedule in self.data_manager.get_schedules():
+            if schedule.get('enabled', True):
+                self._register(schedule)
+        logging.info(f"排程器已啟動，共載入 {len(self.scheduler.get_jobs())} 個排程。")
+
+    def shutdown(self):
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+    @staticmethod
+    def _job_id(schedule_id: int) -> str:
+        return f"schedule:{schedule_id}"
+
+    def _build_trigger(self, schedule: dict):
+        jitter = config.SCHEDULE_JITTER or None
+        kind = schedule.get('kind')
+        if kind == 'daily':
+            hour, minute = schedule['time'].split(':')
+            return CronTrigger(hour=int(hour), minute=int(minute), jitter=jitter)
+        if kind == 'interval':
+            start_date = datetime.fromisoformat(schedule['created_at'])
+            return IntervalTrigger(minutes=schedule['minutes'], start_date=start_date, jitter=jitter)
+        # DateTrigger 不支援 jitter，改在執行時間上加上固定的隨機偏移
+        run_at = datetime.fromisoformat(schedule['run_at'])
+        return DateTrigger(run_date=run_at + timedelta(seconds=random.uniform(0, config.SCHEDULE_JITTER)))
+
+    def _missed_run(self, schedule: dict, trigger) -> bool:
+        """判斷重複性排程在停機期間是否錯過了仍可補執行的時間點。"""
+        if schedule.get('kind') == 'once':
+            # 單次排程的過期時間由 APScheduler 的 misfire_grace_time 直接處理
+            return False
+        baseline = datetime.fromisoformat(schedule.get('last_run') or schedule['created_at']).astimezone()
+        expected = trigger.get_next_fire_time(None, baseline + timedelta(seconds=1))
+        now = datetime.now().astimezone()
+        return expected is not None and expected < now and (now - expected).total_seconds() <= config.SCHEDULE_MISFIRE_GRACE
+
+    def _register(self, schedule: dict):
+        if schedule.get('kind') == 'once':
+            overdue = (datetime.now() - datetime.fromisoformat(schedule['run_at'])).total_seconds()
+            if overdue > config.SCHEDULE_MISFIRE_GRACE:
+                logging.warning(f"單次排程 #{schedule['id']} 已超過補執行期限，將停用。")
+                self.data_manager.update_schedule(schedule['id'], enabled=False)
+                self.data_manager.add_log('schedule', 'FAILURE', f"單次排程 #{schedule['id']} 在停機期間錯過執行，已停用。")
+                return
+        try:
+            trigger = self._build_trigger(schedule)
+        except (KeyError, ValueError) as e:
+            logging.error(f"排程 #{schedule.get('id')} 的資料格式錯誤，已略過: {e}")
+            return
+        self.scheduler.add_job(
+            self._run_schedule, trigger, args=[schedule['id']],
+            id=self._job_id(schedule['id']), replace_existing=True
+        )
+        if self._missed_run(schedule, trigger):
+            logging.info(f"排程 #{schedule['id']} 在停機期間錯過執行，將立即補執行。")
+            self.scheduler.add_job(
+                self._run_schedule, DateTrigger(run_date=datetime.now() + timedelta(seconds=random.uniform(0, config.SCHEDULE_JITTER))),
+                args=[schedule['id']], id=f"{self._job_id(schedule['id'])}:catchup", replace_existing=True
+            )
+
+    def add_schedule(self, schedule: dict) -> int:
+        """儲存新排程並立即註冊到排程器，返回排程 id。"""
+        schedule.setdefault('created_at', datetime.now().isoformat())
+        schedule.setdefault('enabled', True)
+        schedule.setdefault('last_run', None)
+        schedule_id = self.data_manager.add_schedule(schedule)
+        self._register(self.data_manager.get_schedule_by_id(schedule_id))
+        return schedule_id
+
+    def _to_view(self, schedule: dict) -> dict:
+        _, target_name = broadcast_service.resolve_targets(self.data_manager, schedule.get('target_type'), schedule.get('target_id'))
+        return {**schedule, 'description': describe_schedule(schedule), 'target_name': target_name or "目標已不存在"}
+
+    def get_schedule_views(self) -> list:
+        """返回附帶時間描述與目標名稱的排程列表，供面板顯示。"""
+        return [self._to_view(s) for s in self.data_manager.get_schedules()]
+
+    def get_schedule_view(self, schedule_id: int):
+        schedule = self.data_manager.get_schedule_by_id(schedule_id)
+        return self._to_view(schedule) if schedule else None
+
+    def _unregister(self, schedule_id: int):
+        for job_id in (self._job_id(schedule_id), f"{self._job_id(schedule_id)}:catchup"):
+            if self.scheduler.get_job(job_id):
+                self.scheduler.remove_job(job_id)
+
+    def set_enabled(self, schedule_id: int, enabled: bool):
+        schedule = self.data_manager.get_schedule_by_id(schedule_id)
+        if not schedule:
+            return
+        self.data_manager.update_schedule(schedule_id, enabled=enabled)
+        if enabled:
+            self._register(schedule)
+        else:
+            self._unregister(schedule_id)
+
+    def delete_schedule(self, schedule_id: int):
+        self._unregister(schedule_id)
+        self.data_manager.delete_schedule(schedule_id)
+
+    async def _run_schedule(self, schedule_id: int):
+        schedule = self.data_manager.get_schedule_by_id(schedule_id)
+        if not schedule or not schedule.get('enabled', True):
+            return
+        fields = {'last_run': datetime.now().isoformat()}
+        if schedule.get('kind') == 'once':
+            fields['enabled'] = False
+        self.data_manager.update_schedule(schedule_id, **fields)
+
+        target_channels, target_name = broadcast_service.resolve_targets(
+            self.data_manager, schedule.get('target_type'), schedule.get('target_id')
+        )
+        if not target_channels:
+            self.data_manager.add_log('schedule', 'FAILURE', f"排程 #{schedule_id} 找不到推播目標。")
+            return
+        try:
+            message = await self.client.get_messages(schedule['source_chat_id'], schedule['source_message_id'])
+        except Exception as e:
+            message = None
+            logging.error(f"排程 #{schedule_id} 讀取來源訊息失敗: {e}")
+        if not message or message.empty:
+            self.data_manager.add_log('schedule', 'FAILURE', f"排程 #{schedule_id} 的來源訊息已不存在。")
+            return
+
+        # 排程本來就會定期推播相同內容，只防止同一次執行內的重複發送
+        job = self.job_service.create_job(message, target_channels, target_name, schedule.get('created_by', 'System'), dedup_window=0)
+        try:
+            # 以背景工作執行，可用 .cancel <工作編號> 停止
+            success, failed = await self.job_service.start_job(job, message)
+        except asyncio.CancelledError:
+            if job.get('status') == 'running':
+                # 程式結束時中斷，工作維持 running，下次啟動時自動恢復
+                raise
+            success, failed = self.job_service.count_results(job)
+            self.data_manager.add_log('broadcast', 'CANCELLED', f"排程 #{schedule_id} 推播到「{target_name}」已取消。結果: 成功 {success}, 失敗 {failed}。", schedule.get('created_by', 'System'))
+            return
+        skipped = self.job_service.count_skipped(job)
+        log_status = 'SUCCESS' if failed == 0 else 'PARTIAL_SUCCESS' if success > 0 else 'FAILURE'
+        self.data_manager.add_log('broadcast', log_status, f"排程 #{schedule_id} 推播到「{target_name}」。結果: 成功 {success}, 失敗 {failed}, 略過 {skipped}。", schedule.get('created_by', 'System'))
+        try:
+            await self.client.send_message(
+                config.CONTROL_GROUP,
+                f"⏰ **排程 #{schedule_id} 已執行**\n\n- **目標**: {target_name}\n- **成功**: {success} 個\n- **失敗**: {failed} 個"
+                + (f"\n- **略過 (重複)**: {skipped} 個" if skipped else ""),
+                parse_mode=ParseMode.MARKDOWN
+            )
+        except Exception as e:
+            logging.error(f"回報排程 #{schedule_id} 執行結果失敗: {e}")
@@ -0,0 +1,100 @@
+# 檔案：services/send_ledger.py
+# 職責：推播的冪等性帳本。以 (內容雜湊, 目標 chat id) 為鍵記錄最近的成功發送與其所屬工作，
+#       實際呼叫 API 前先查表，重試、重複送出與重新啟動都不會把同一則內容重複推播到同一個群組。
+
+import time
+from collections import OrderedDict
+import config
+
+class SendLedger:
+    """
+    entries：鍵 -> [發送時間 (timestamp), 工作 id]，依發送時間排序，超過 ttl 秒的紀錄從最舊的一端淘汰。
+    查詢、預留與記錄都是 O(1) (淘汰為攤銷 O(1))。
+    判斷為重複的條件：
+    - 同一個工作已送達過 (FloodWait 重試、恢復中斷的工作、目標清單中重複的群組)；
+    - 或其他工作在 window 秒內送達過相同內容 (不小心重複送出)。
+    inflight 記錄正在發送中的鍵，避免並行的兩次發送同時通過檢查。
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.inflight = {}  # 鍵 -> 工作 id
+
+    @staticmethod
+    def key(fingerprint: str, chat_id) -> str:
+        # 取雜湊的前 16 個字元 (64 位元) 已足以區分，保持帳本精簡
+        return f"{fingerprint[:16]}:{chat_id}"
+
+    def _evict(self, now: float):
+        cutoff = now - self.ttl
+        while self.entries and next(iter(self.entries.values()))[0] <= cutoff:
+            self.entries.popitem(last=False)
+
+    def is_duplicate(self, key: str, job_id, window: float, now: float = None) -> bool:
+        now = now or time.time()
+        self._evict(now)
+        entry = self.entries.get(key)
+        if entry is None:
+            return False
+        sent_at, sent_job_id = entry
+        return sent_job_id == job_id or now - sent_at < window
+
+    def reserve(self, key: str, job_id, window: float) -> bool:
+        """發送前呼叫：不是重複發送時預留此鍵並返回 True，之後必須呼叫 commit() 或 release()。"""
+        if key in self.inflight and (self.inflight[key] == job_id or window > 0):
+            return False
+        if self.is_duplicate(key, job_id, window):
+            return False
+        self.inflight[key] = job_id
+        return True
+
+    def commit(self, key: str, job_id):
+        """發送成功：記錄到帳本。"""
+        self.inflight.pop(key, None)
+        self.entries[key] = [time.time(), job_id]
+        self.entries.move_to_end(key)
+
+    def release(self, key: str):
+        """發送失敗或被取消：釋放預留，之後可以再次發送。"""
+        self.inflight.pop(key, None)
+
+    def scope(self, fingerprint: str, job_id, window: float, on_commit=None) -> 'LedgerScope':
+        return LedgerScope(self, fingerprint, job_id, window, on_commit)
+
+    def load(self, entries: dict):
+        """載入保存的帳本 (見 DataManager.get_send_ledger)，已過期的紀錄會被略過。"""
+        for key, entry in sorted(entries.items(), key=lambda item: item[1][0]):
+            self.entries[key] = list(entry)
+        self._evict(time.time())
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+class LedgerScope:
+    """
+    一次推播 (同一則內容、同一個工作) 使用的帳本介面，broadcast_to_targets 只需提供 chat id。
+    on_commit(key, entry) 在每次記錄成功發送後呼叫，供呼叫端逐筆保存新紀錄。
+    """
+
+    def __init__(self, ledger: SendLedger, fingerprint: str, job_id, window: float, on_commit=None):
+        self.ledger = ledger
+        self.fingerprint = fingerprint
+        self.job_id = job_id
+        self.window = window
+        self.on_commit = on_commit
+
+    def reserve(self, chat_id) -> bool:
+        return self.ledger.reserve(SendLedger.key(self.fingerprint, chat_id), self.job_id, self.window)
+
+    def commit(self, chat_id):
+        key = SendLedger.key(self.fingerprint, chat_id)
+        self.ledger.commit(key, self.job_id)
+        if self.on_commit:
+            self.on_commit(key, self.ledger.entries[key])
+
+    def release(self, chat_id):
+        self.ledger.release(SendLedger.key(self.fingerprint, chat_id))
+
+# 所有推播共用的帳本，啟動時由 main 載入保存的紀錄
+send_ledger = SendLedger(config.BROADCAST_LEDGER_TTL)
@@ -0,0 +1,74 @@
+# 檔案：services/target_registry.py
+# 職責：目標群組登記表。啟動時把 TARGET_CHANNELS 的每個字串正規化一次 (數字 ID 轉為 int、
+#       @username 解析為 chat id)，並在背景定期把群組資訊載入共用快取，所有服務共用同一份結果。
+
+import asyncio
+import logging
+from datetime import datetime
+from pyrogram import Client
+import config
+
+def normalize(target):
+    """不需呼叫 API 的正規化：數字 ID 轉為 int，其餘 (例如 @username) 保持原樣。"""
+    if isinstance(target, int):
+        return target
+    text = str(target).strip()
+    return int(text) if text.lstrip('-').isdigit() else text
+
+class TargetRegistry:
+    """
+    raw 目標字串 -> chat id 的對照表。
+    建立時只做字串正規化；resolve() 把 @username 解析成 chat id (每個只呼叫一次 API)，
+    之後推播、查詢群組資訊與檢查聊天記錄都直接查表，不再重複解析。
+    """
+
+    def __init__(self, raw_targets: list):
+        self.raw_targets = list(raw_targets)
+        self.peers = {str(raw): normalize(raw) for raw in self.raw_targets}
+        self.refreshed_at = None
+
+    def chat_id(self, target):
+        """返回目標的 chat id；不在登記表中的目標 (例如組合中保存的 int ID) 直接正規化。"""
+        peer = self.peers.get(target if isinstance(target, str) else str(target))
+        return peer if peer is not None else normalize(target)
+
+    def unresolved(self) -> list:
+        return [raw for raw, peer in self.peers.items() if isinstance(peer, str)]
+
+    async def resolve(self, client: Client):
+        """解析所有尚未解析的 @username 目標，失敗者保持原樣並於下次更新時重試。"""
+        for raw in self.unresolved():
+            try:
+                chat = await client.get_chat(self.peers[raw])
+            except Exception as e:
+                logging.warning(f"無法解析目標 {raw}，將於下次更新時重試: {e}")
+                continue
+            self.peers[raw] = chat.id
+            logging.info(f"目標 {raw} 已解析為 {chat.id}。")
+
+    async def refresh(self, client: Client) -> list:
+        """解析目標並強制更新所有目標的群組資訊快取 (以 CHAT_FETCH_CONCURRENCY 限制並行數)，返回各目標的資訊。"""
+        # 延遲匯入，避免與 info_service 互相匯入
+        from . import info_service
+        await self.resolve(client)
+        details = await info_service.get_all_channel_details(client, self.raw_targets, force_refresh=True)
+        self.refreshed_at = datetime.now()
+        logging.info(f"目標登記表已更新，共 {len(self.raw_targets)} 個目標，{len(self.unresolved())} 個尚未解析。")
+        return details
+
+    async def run_refresher(self, client: Client, interval: float, on_refresh=None):
+        """
+        立即更新一次，之後每隔 interval 秒在背景更新。
+        on_refresh(raw_targets, details) 為可選的非同步回呼，每次更新後收到所有目標的最新資訊 (例如健康監控)。
+        """
+        while True:
+            try:
+                details = await self.refresh(client)
+                if on_refresh:
+                    await on_refresh(self.raw_targets, details)
+            except Exception as e:
+                logging.error(f"更新目標登記表失敗: {e}", exc_info=True)
+            await asyncio.sleep(interval)
+
+# 所有服務共用同一份登記表
+target_registry = TargetRegistry(config.TARGET_CHANNELS_STR)
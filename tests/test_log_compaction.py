@@ -0,0 +1,44 @@
+# 檔案：tests/test_log_compaction.py
+# 職責：日誌壓縮前後的統計數量必須一致 (彙總與原始日誌的分界不能漏算或重複計算)。
+
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from data.data_manager import DataManager
+
+class LogCompactionCountTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.workdir.name, 'data.json')
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def _count_week(self, data_manager: DataManager, action: str = None) -> int:
+        return data_manager.count_logs(datetime.now() - timedelta(days=7), action=action)
+
+    def test_count_unchanged_after_compaction_by_max_entries(self):
+        async def run():
+            data_manager = DataManager(self.db_path, save_delay=0)
+            data_manager.start()
+            for i in range(60):
+                data_manager.add_log('broadcast' if i % 2 else 'command', 'SUCCESS', f"log {i}")
+            before = (self._count_week(data_manager), self._count_week(data_manager, 'broadcast'))
+            # 每次依筆數上限壓縮都不能漏算分界上的日誌
+            for max_entries in (30, 10, 3):
+                await data_manager.compact_logs(retention_seconds=86400, max_entries=max_entries, rollup_retention_seconds=86400 * 365)
+                self.assertEqual((self._count_week(data_manager), self._count_week(data_manager, 'broadcast')), before)
+            await data_manager.close()
+
+            reloaded = DataManager(self.db_path)
+            self.assertEqual((self._count_week(reloaded), self._count_week(reloaded, 'broadcast')), before)
+            await reloaded.close()
+            return before
+
+        self.assertEqual(asyncio.run(run()), (60, 30))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,20 @@
+# 檔案：tests/test_log_store.py
+# 職責：日誌記憶體索引的計數行為。
+
+import unittest
+from data.log_store import RollingCounter
+
+class RollingCounterTest(unittest.TestCase):
+
+    def test_out_of_order_events_expire(self):
+        counter = RollingCounter(window_seconds=100)
+        counter.add(1000, 'broadcast')
+        counter.add(950, 'command')  # 順序錯亂、較早過期的紀錄
+        counter.add(1010, 'broadcast')
+        self.assertEqual(counter.count(now=1049), 3)
+        self.assertEqual(counter.count(now=1060), 2)
+        self.assertEqual(counter.count(now=1060, action='command'), 0)
+        self.assertEqual(counter.count(now=1105, action='broadcast'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
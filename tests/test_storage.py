@@ -0,0 +1,44 @@
+# 檔案：tests/test_storage.py
+# 職責：儲存後端的載入與搬移行為。
+
+import json
+import os
+import tempfile
+import unittest
+from data.storage import JsonStorage
+
+class JsonStorageLegacyLogsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.workdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.workdir.name, 'data.json')
+        self.legacy = {'drafts': [], 'logs': [
+            {'time': f"2024-01-01T00:00:0{i}", 'action': 'broadcast', 'status': 'SUCCESS', 'message': f"log {i}", 'user': "System"}
+            for i in range(3)
+        ]}
+
+    def tearDown(self):
+        self.workdir.cleanup()
+
+    def _write_legacy_header(self):
+        with open(self.db_path, 'w', encoding='utf-8') as f:
+            json.dump(self.legacy, f)
+
+    def test_migration_moves_logs_out_of_header(self):
+        self._write_legacy_header()
+        data, logs, _ = JsonStorage(self.db_path).load()
+        self.assertNotIn('logs', data)
+        self.assertEqual(len(logs), 3)
+        with open(self.db_path, encoding='utf-8') as f:
+            self.assertNotIn('logs', json.load(f))
+
+    def test_migration_interrupted_before_header_rewrite_does_not_duplicate(self):
+        self._write_legacy_header()
+        JsonStorage(self.db_path).load()
+        # 模擬搬移後、改寫 data.json 前中斷：data.json 仍保留 'logs'
+        self._write_legacy_header()
+        _, logs, _ = JsonStorage(self.db_path).load()
+        self.assertEqual([entry['message'] for entry in logs], ["log 0", "log 1", "log 2"])
+
+if __name__ == '__main__':
+    unittest.main()
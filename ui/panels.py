@@ -19,6 +19,7 @@ def create_main_panel(stats: dict) -> dict:
 - 推播組合: {stats.get('set_count', 0)} 組
 - 目標群組: {stats.get('total_target_count', 0)} 個
 - 24H內推播: {stats.get('today_broadcasts', 0)} 次
+- 7天內推播: {stats.get('week_broadcasts', 0)} 次
 
 💡 使用 `{config.COMMAND_PREFIX}start` 可刷新此面板。"""
     keyboard = InlineKeyboardMarkup([
@@ -42,9 +43,44 @@ def create_group_management_panel() -> dict:
     keyboard = InlineKeyboardMarkup([
         [InlineKeyboardButton("🎯 推播組合管理", callback_data="groups:manage_sets")],
         [InlineKeyboardButton("🔗 測試群組連線", callback_data="groups:test_all")],
+        [InlineKeyboardButton("📡 掃描所有群組", callback_data="groups:scan_all")],
         [create_back_button("back:main")]])
     return {'text': text, 'reply_markup': keyboard}
 
+def create_channel_health_panel(rows: list, checked_at: str) -> dict:
+    """群組連線測試結果 (來自背景健康檢查)；群組名稱可能含有 Markdown 符號，因此使用純文字。"""
+    broken = [r for r in rows if r['error']]
+    checked = (checked_at or '')[:16].replace('T', ' ')
+    lines = []
+    for r in broken + [r for r in rows if not r['error']]:
+        if r['error']:
+            lines.append(f"❌ {r['title']}: 無法訪問 ({r['error']})")
+        else:
+            change = f" ({r['change']:+d} / 7天)" if r['change'] else ""
+            lines.append(f"• {r['title']}: {r['members'] if r['members'] is not None else 'N/A'} 人{change}")
+    text = f"👥 群組連線測試結果 ({len(rows)}個，{len(broken)} 個無法訪問)\n最後檢查: {checked}\n\n" + "\n".join(lines)
+    return {'text': text[:4090] + "\n..." if len(text) > 4096 else text}
+
+SCAN_RESULTS_PAGE_SIZE = 20
+
+def create_scan_results_panel(dialogs: list, page: int = 0) -> dict:
+    total_pages = max((len(dialogs) - 1) // SCAN_RESULTS_PAGE_SIZE + 1, 1)
+    page = min(max(page, 0), total_pages - 1)
+    start = page * SCAN_RESULTS_PAGE_SIZE
+    lines = [f"• **{d['title']}**\n  `{d['id']}` ({d['type']})" for d in dialogs[start:start + SCAN_RESULTS_PAGE_SIZE]]
+    text = f"📡 **群組掃描結果** (共 {len(dialogs)} 個，第 {page + 1}/{total_pages} 頁)\n\n"
+    text += "\n".join(lines) if lines else "未在您的帳號中發現任何超級群組或頻道。"
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️ 上一頁", callback_data=f"scan:page:{page - 1}"))
+    if page < total_pages - 1:
+        nav.append(InlineKeyboardButton("下一頁 ➡️", callback_data=f"scan:page:{page + 1}"))
+    buttons = [nav] if nav else []
+    buttons.append([InlineKeyboardButton("🔄 完整重新掃描", callback_data="groups:scan_full")])
+    buttons.append([create_back_button("back:groups")])
+    return {'text': text, 'reply_markup': InlineKeyboardMarkup(buttons), 'parse_mode': ParseMode.MARKDOWN}
+
 def create_broadcast_set_management_panel(sets: list) -> dict:
     text = "管理您的推播組合。\n點擊組合可進行編輯。"
     buttons = [[InlineKeyboardButton(f"⚙️ {s['name']} ({len(s['channels'])}個)", callback_data=f"set:view:{s['id']}")] for s in sets]
@@ -52,11 +88,21 @@ def create_broadcast_set_management_panel(sets: list) -> dict:
     buttons.append([create_back_button("back:groups")])
     return {'text': text, 'reply_markup': InlineKeyboardMarkup(buttons)}
 
-def create_broadcast_set_editor_panel(set_id: int, set_name: str, all_channels: list, selected_channels: list) -> dict:
-    text = f"正在編輯組合: **{set_name}**\n已選 {len(selected_channels)} / {len(all_channels)} 個群組。"
+SET_EDITOR_PAGE_SIZE = 20
+
+def create_broadcast_set_editor_panel(set_id: int, set_name: str, page_channels: list, selected_channels: set,
+                                      total_count: int, page: int = 0, total_pages: int = 1, search: str = None) -> dict:
+    """只顯示目前這一頁的群組；全選/清空作用於目前搜尋結果中的所有群組。"""
+    text = f"正在編輯組合: **{set_name}**\n已選 {len(selected_channels)} 個群組。"
+    if search:
+        text += f"\n🔍 搜尋「{search}」：符合 {total_count} 個。"
+    else:
+        text += f"\n共 {total_count} 個目標群組。"
+    if total_pages > 1:
+        text += f"\n第 {page + 1} / {total_pages} 頁"
     buttons = []
     row = []
-    for ch in all_channels:
+    for ch in page_channels:
         ch_id = int(ch['id']) if isinstance(ch['id'], str) and ch['id'].lstrip('-').isdigit() else ch['id']
         prefix = "✅" if ch_id in selected_channels else "⬜️"
         button = InlineKeyboardButton(f"{prefix} {ch['title'][:20]}", callback_data=f"set:edit_toggle:{set_id}:{ch_id}")
@@ -65,7 +111,18 @@ def create_broadcast_set_editor_panel(set_id: int, set_name: str, all_channels:
             buttons.append(row)
             row = []
     if row: buttons.append(row)
-    
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️ 上一頁", callback_data=f"set:edit_page:{set_id}:{page - 1}"))
+    if page < total_pages - 1:
+        nav.append(InlineKeyboardButton("下一頁 ➡️", callback_data=f"set:edit_page:{set_id}:{page + 1}"))
+    if nav: buttons.append(nav)
+    search_row = [InlineKeyboardButton("🔍 搜尋", callback_data=f"set:edit_search:{set_id}")]
+    if search:
+        search_row.append(InlineKeyboardButton("❌ 清除搜尋", callback_data=f"set:edit_search_clear:{set_id}"))
+    buttons.append(search_row)
+
     buttons.extend([
         [InlineKeyboardButton("✅ 全選", callback_data=f"set:edit_all:{set_id}"), InlineKeyboardButton("⬜️ 清空", callback_data=f"set:edit_none:{set_id}")],
         [InlineKeyboardButton(f"💾 儲存組合 ({len(selected_channels)}個)", callback_data=f"set:save:{set_id}")],
@@ -83,3 +140,108 @@ def create_delete_confirmation_panel(set_id: int, set_name: str) -> dict:
         [create_back_button(f"set:view:{set_id}")]])
     # [修正] 使用 ParseMode.MARKDOWN
     return {'text': text, 'reply_markup': keyboard, 'parse_mode': ParseMode.MARKDOWN}
+
+# --- 排程管理 ---
+def create_schedule_management_panel(schedules: list) -> dict:
+    text = "⏰ **排程管理**\n點擊排程可查看詳情或刪除。" if schedules else "⏰ **排程管理**\n目前沒有任何排程。"
+    buttons = []
+    for sch in schedules:
+        prefix = "🟢" if sch.get('enabled', True) else "⏸"
+        buttons.append([InlineKeyboardButton(f"{prefix} #{sch['id']} {sch['description']} → {sch['target_name']}"[:60], callback_data=f"schedule:view:{sch['id']}")])
+    buttons.append([InlineKeyboardButton("➕ 新增排程", callback_data="schedule:add")])
+    buttons.append([create_back_button("back:main")])
+    return {'text': text, 'reply_markup': InlineKeyboardMarkup(buttons), 'parse_mode': ParseMode.MARKDOWN}
+
+def create_schedule_target_panel(sets: list) -> dict:
+    text = "請選擇排程的推播目標："
+    buttons = [[InlineKeyboardButton("📢 所有群組", callback_data="schedule:target:all")]]
+    buttons.extend([[InlineKeyboardButton(f"🎯 {s['name']} ({len(s['channels'])}個)", callback_data=f"schedule:target_set:{s['id']}")] for s in sets])
+    buttons.append([create_back_button("main:schedule")])
+    return {'text': text, 'reply_markup': InlineKeyboardMarkup(buttons)}
+
+def create_schedule_detail_panel(schedule: dict) -> dict:
+    enabled = schedule.get('enabled', True)
+    last_run = (schedule.get('last_run') or '尚未執行')[:16].replace('T', ' ')
+    text = f"""⏰ **排程 #{schedule['id']}**
+
+- 時間: {schedule['description']}
+- 目標: {schedule['target_name']}
+- 狀態: {'啟用中' if enabled else '已停用'}
+- 上次執行: {last_run}"""
+    keyboard = InlineKeyboardMarkup([
+        [InlineKeyboardButton("⏸ 停用" if enabled else "▶️ 啟用", callback_data=f"schedule:toggle:{schedule['id']}")],
+        [InlineKeyboardButton("🗑️ 刪除此排程", callback_data=f"schedule:delete:{schedule['id']}")],
+        [create_back_button("main:schedule")]])
+    return {'text': text, 'reply_markup': keyboard, 'parse_mode': ParseMode.MARKDOWN}
+
+# --- 草稿管理 ---
+def create_draft_management_panel(drafts: list) -> dict:
+    text = "📝 **草稿管理**\n點擊草稿可查看、推播或刪除。" if drafts else "📝 **草稿管理**\n目前沒有任何草稿。"
+    buttons = [[InlineKeyboardButton(f"#{d['id']} {d['preview']}"[:60], callback_data=f"drafts:view:{d['id']}")] for d in drafts]
+    buttons.append([InlineKeyboardButton("➕ 新增草稿", callback_data="drafts:add")])
+    buttons.append([create_back_button("back:main")])
+    return {'text': text, 'reply_markup': InlineKeyboardMarkup(buttons), 'parse_mode': ParseMode.MARKDOWN}
+
+def create_draft_detail_panel(draft: dict, sets: list) -> dict:
+    """草稿詳情；內容預覽來自使用者訊息，因此使用純文字。"""
+    created_at = (draft.get('created_at') or '')[:16].replace('T', ' ')
+    text = f"""📝 草稿 #{draft['id']}
+
+- 內容: {draft['preview']}
+- 建立者: {draft.get('user', '')}
+- 建立時間: {created_at}
+
+請選擇推播目標，或刪除此草稿。"""
+    buttons = [[InlineKeyboardButton("📢 推播到所有群組", callback_data=f"drafts:send:{draft['id']}:all")]]
+    buttons.extend([[InlineKeyboardButton(f"🎯 推播到 {s['name']} ({len(s['channels'])}個)", callback_data=f"drafts:send:{draft['id']}:set:{s['id']}")] for s in sets])
+    buttons.append([InlineKeyboardButton("🗑️ 刪除此草稿", callback_data=f"drafts:delete:{draft['id']}")])
+    buttons.append([create_back_button("main:drafts")])
+    return {'text': text, 'reply_markup': InlineKeyboardMarkup(buttons)}
+
+# --- 推播記錄 ---
+LOG_PAGE_SIZE = 10
+# 時間範圍代碼 -> (顯示名稱, 小時數；None 為全部)
+LOG_RANGES = {'24h': ("24 小時", 24), '7d': ("7 天", 24 * 7), '30d': ("30 天", 24 * 30), 'all': ("全部", None)}
+LOG_FILTER_FIELDS = {'action': "類型", 'status': "狀態", 'user': "使用者"}
+LOG_FILTER_MAX_VALUES = 50  # 篩選面板最多顯示的選項數
+LOG_STATUS_ICONS = {'SUCCESS': "✅", 'PARTIAL_SUCCESS': "⚠️", 'FAILURE': "❌", 'INFO': "ℹ️", 'CANCELLED': "⛔"}
+
+def create_log_browser_panel(logs: list, total: int, page: int, filters: dict) -> dict:
+    """顯示一頁日誌 (由新到舊)；日誌內容可能含有 Markdown 符號，因此使用純文字。"""
+    total_pages = max((total - 1) // LOG_PAGE_SIZE + 1, 1)
+    range_label = LOG_RANGES[filters.get('range', 'all')][0]
+    active = [f"{label}: {filters[field]}" for field, label in LOG_FILTER_FIELDS.items() if filters.get(field)]
+    text = f"📊 推播記錄 (範圍: {range_label}{'，' + '，'.join(active) if active else ''})\n共 {total} 筆，第 {page + 1} / {total_pages} 頁\n\n"
+    if logs:
+        lines = []
+        for entry in logs:
+            time_text = str(entry.get('time', ''))[5:16].replace('T', ' ')
+            icon = LOG_STATUS_ICONS.get(entry.get('status'), "•")
+            lines.append(f"{icon} {time_text} {entry.get('action')} ({entry.get('user')})\n   {str(entry.get('message', ''))[:80]}")
+        text += "\n".join(lines)
+    else:
+        text += "沒有符合條件的記錄。"
+
+    buttons = [[InlineKeyboardButton(f"{label}: {filters.get(field) or '全部'}", callback_data=f"logs:pick:{field}")]
+               for field, label in LOG_FILTER_FIELDS.items()]
+    buttons.append([
+        InlineKeyboardButton(("🔘 " if filters.get('range', 'all') == key else "") + label, callback_data=f"logs:range:{key}")
+        for key, (label, _) in LOG_RANGES.items()
+    ])
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("⬅️ 較新", callback_data=f"logs:page:{page - 1}"))
+    if page < total_pages - 1:
+        nav.append(InlineKeyboardButton("較舊 ➡️", callback_data=f"logs:page:{page + 1}"))
+    if nav:
+        buttons.append(nav)
+    buttons.append([create_back_button("back:main")])
+    return {'text': text, 'reply_markup': InlineKeyboardMarkup(buttons)}
+
+def create_log_filter_panel(field: str, values: list) -> dict:
+    """列出某個欄位的所有值供選擇，callback 以值在列表中的位置表示 (避免超過 64 位元組的限制)，呼叫端需保存 values 以對應選項。"""
+    text = f"選擇要篩選的{LOG_FILTER_FIELDS[field]}："
+    buttons = [[InlineKeyboardButton("全部", callback_data=f"logs:set:{field}:-")]]
+    buttons.extend([[InlineKeyboardButton(str(value)[:40], callback_data=f"logs:set:{field}:{i}")] for i, value in enumerate(values[:LOG_FILTER_MAX_VALUES])])
+    buttons.append([create_back_button("logs:page:0")])
+    return {'text': text, 'reply_markup': InlineKeyboardMarkup(buttons)}
@@ -0,0 +1,44 @@
+# 檔案：ui/progress.py
+# 職責：節流的進度訊息。推播期間的每次結果都可以呼叫 update()，
+#       實際的訊息編輯每 interval 秒最多一次，只顯示最新的進度。
+
+import asyncio
+import logging
+import time
+from . import render_cache
+
+class ThrottledProgress:
+    """render(state) 返回要顯示的文字；最後一次 update() 的狀態一定會在 interval 秒內顯示出來。"""
+
+    def __init__(self, message, render, interval: float, parse_mode=None):
+        self.message = message
+        self.render = render
+        self.interval = interval
+        self.parse_mode = parse_mode
+        self.latest = None
+        self.last_edit = time.monotonic()  # 訊息剛送出，第一次編輯也要等滿 interval
+        self._task = None
+
+    def update(self, state):
+        self.latest = state
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        wait = self.last_edit + self.interval - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self.last_edit = time.monotonic()
+        try:
+            await render_cache.edit_panel(self.message, self.render(self.latest), parse_mode=self.parse_mode)
+        except Exception as e:
+            logging.warning(f"更新進度訊息失敗: {e}")
+
+    async def stop(self):
+        """停止尚未送出的進度更新 (最終結果由呼叫端自行顯示)。"""
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
@@ -0,0 +1,89 @@
+# 檔案：ui/render_cache.py
+# 職責：面板的渲染快取與編輯去重。
+#       - cached()：依資料版本號記住面板產生結果，資料沒變就不重建按鈕。
+#       - edit_panel()：記錄每則訊息目前顯示內容的雜湊，內容相同時直接略過 edit_text，不發出任何網路請求。
+
+import hashlib
+import logging
+from collections import OrderedDict
+from pyrogram.errors import MessageNotModified
+
+class PanelCache:
+    """以 (面板名稱, 版本號) 為鍵的 LRU 快取。"""
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+
+    def get_or_build(self, key: tuple, build):
+        panel = self.entries.get(key)
+        if panel is None:
+            panel = build()
+            self.entries[key] = panel
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        else:
+            self.entries.move_to_end(key)
+        return panel
+
+panel_cache = PanelCache()
+
+def cached(name: str, version, builder, *args, **kwargs) -> dict:
+    """
+    返回 builder(*args, **kwargs) 的結果；相同的 name 與 version 只會建立一次。
+    version 必須涵蓋面板所依賴的所有資料 (例如 DataManager.get_version() 的結果)。
+    """
+    return panel_cache.get_or_build((name, version), lambda: builder(*args, **kwargs))
+
+def content_hash(text: str, reply_markup=None, parse_mode=None) -> str:
+    """計算面板內容的雜湊 (文字、解析模式與所有按鈕)。"""
+    parts = [text or "", str(parse_mode)]
+    if reply_markup is not None:
+        for row in getattr(reply_markup, 'inline_keyboard', []):
+            parts.append("\x1f".join(f"{b.text}\x1e{b.callback_data}\x1e{b.url}" for b in row))
+    return hashlib.sha1("\x1d".join(parts).encode('utf-8')).hexdigest()
+
+# (chat_id, message_id) -> 目前顯示內容的雜湊
+_shown = OrderedDict()
+_SHOWN_MAX = 1000
+
+def _remember(key: tuple, digest: str):
+    _shown[key] = digest
+    _shown.move_to_end(key)
+    while len(_shown) > _SHOWN_MAX:
+        _shown.popitem(last=False)
+
+def remember_sent(message, text: str, reply_markup=None, parse_mode=None):
+    """記錄剛發送的面板訊息內容，之後對它的相同編輯會被略過。"""
+    _remember((message.chat.id, message.id), content_hash(text, reply_markup, parse_mode))
+
+async def _edit(key: tuple, do_edit, text: str, reply_markup, parse_mode) -> bool:
+    digest = content_hash(text, reply_markup, parse_mode)
+    if _shown.get(key) == digest:
+        logging.debug(f"面板內容未變更，略過編輯 {key}。")
+        return False
+    try:
+        await do_edit()
+    except MessageNotModified:
+        pass
+    _remember(key, digest)
+    return True
+
+async def edit_panel(message, text: str, reply_markup=None, parse_mode=None, **kwargs) -> bool:
+    """
+    與 message.edit_text() 參數相同；內容與目前顯示的相同時不呼叫 API。
+    返回是否實際送出了編輯。
+    """
+    return await _edit(
+        (message.chat.id, message.id),
+        lambda: message.edit_text(text, reply_markup=reply_markup, parse_mode=parse_mode, **kwargs),
+        text, reply_markup, parse_mode
+    )
+
+async def edit_panel_by_id(client, chat_id: int, message_id: int, text: str, reply_markup=None, parse_mode=None, **kwargs) -> bool:
+    """與 client.edit_message_text() 參數相同的版本，同樣會略過沒有變化的編輯。"""
+    return await _edit(
+        (chat_id, message_id),
+        lambda: client.edit_message_text(chat_id=chat_id, message_id=message_id, text=text, reply_markup=reply_markup, parse_mode=parse_mode, **kwargs),
+        text, reply_markup, parse_mode
+    )